@@ -72,6 +72,34 @@ class ContentGenerator(Agent):
 class HtmlCompiler(Agent):
     """Interface for HTML compilation agents"""
     
+    @abstractmethod
+    async def generate_images(self, content: Dict) -> Dict[str, str]:
+        """
+        Generate the images for an email from its content
+        
+        Args:
+            content: Dictionary containing generated content fields
+            
+        Returns:
+            Dictionary of image placeholders and their image URLs
+        """
+        pass
+    
+    @abstractmethod
+    async def render(self, template: str, content: Dict, images: Dict[str, str]) -> str:
+        """
+        Render the email HTML from already generated content and images
+        
+        Args:
+            template: Name of the template to use
+            content: Dictionary containing content to inject
+            images: Dictionary of image placeholders and their image URLs
+            
+        Returns:
+            Compiled HTML
+        """
+        pass
+    
     @abstractmethod
     async def compile_html(self, template: str, content: Dict) -> str:
         """
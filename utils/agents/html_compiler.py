@@ -7,8 +7,9 @@ for compiling the final HTML email with content and images.
 import asyncio
 from typing import Dict
 from .base import HtmlCompiler
-from ..services.ai_service import GeminiService
-from ..services.template_service import TemplateService
+from ..services.ai_service import GeminiService, build_image_prompts, build_image_subjects
+from ..services.template_service import get_template_service
+from ..core.config import get_app_setting
 from ..core.exceptions import EmailCompilationError
 
 class GeminiHtmlCompiler(HtmlCompiler):
@@ -18,7 +19,7 @@ class GeminiHtmlCompiler(HtmlCompiler):
         """Initialize the HTML compilation agent"""
         super().__init__()
         self.ai_service = GeminiService()
-        self.template_service = TemplateService()
+        self.template_service = get_template_service()
         
     async def execute(self, *args, **kwargs) -> str:
         """Execute the agent's primary function"""
@@ -33,24 +34,77 @@ class GeminiHtmlCompiler(HtmlCompiler):
         
         Args:
             template: Name of the template to use
-            content: Dictionary containing content and image URLs to inject
+            content: Dictionary containing content to inject
+            
+        Returns:
+            Compiled HTML
+        """
+        images = await self.generate_images(content)
+        return await self.render(template, content, images)
+    
+    async def generate_images(self, content: Dict) -> Dict[str, str]:
+        """
+        Generate all images needed for the email template based on content
+        
+        The image prompts only depend on the generated content, so this can
+        run while the template is still being selected.
+        
+        Args:
+            content: Dictionary containing email content fields
+            
+        Returns:
+            Dictionary of image placeholders and their generated image URLs
+        """
+        try:
+            self.update_status("Generating images", 0.1)
+            
+            prompts = build_image_prompts(content)
+            subjects = build_image_subjects(content)
+            
+            # Request all images at once
+            hero_variants = get_app_setting("image_cache.hero_variants") or 1
+            results = await asyncio.gather(*[
+                self.ai_service.agenerate_image(
+                    prompt,
+                    number_of_images=hero_variants if name == 'HERO_IMAGE' else 1,
+                    slot=name,
+                    subject=subjects[name]
+                )
+                for name, prompt in prompts.items()
+            ])
+            
+            self.update_status("Images ready", 0.5)
+            return dict(zip(prompts.keys(), results))
+            
+        except Exception as e:
+            self.update_status(f"Error: {str(e)}", 1.0)
+            raise EmailCompilationError(f"Image generation failed: {str(e)}")
+    
+    async def render(self, template: str, content: Dict, images: Dict[str, str]) -> str:
+        """
+        Render the email HTML from already generated content and images
+        
+        Args:
+            template: Name of the template to use
+            content: Dictionary containing content to inject
+            images: Dictionary of image placeholders and their image URLs
             
         Returns:
             Compiled HTML
         """
         try:
-            self.update_status("Processing template", 0.3)
+            self.update_status("Processing template", 0.6)
             
-            # Render the template with the content (which now includes images)
+            # Render the template with the content and images
             html = self.template_service.render_template(
                 template_name=template,
-                content=content
+                content={**content, **images}
             )
             
             if not html:
                 raise EmailCompilationError("Failed to generate HTML")
             
-            self.update_status("Validating HTML", 0.7)
+            self.update_status("Validating HTML", 0.8)
             await asyncio.sleep(0.1)  # Allow UI to update
             
             # Basic HTML validation
@@ -63,5 +117,3 @@ class GeminiHtmlCompiler(HtmlCompiler):
         except Exception as e:
             self.update_status(f"Error: {str(e)}", 1.0)
             raise EmailCompilationError(f"Email compilation failed: {str(e)}")
-    
-
@@ -8,7 +8,7 @@ import asyncio
 from typing import List
 from .base import TemplateSelector
 from ..services.ai_service import GeminiService
-from ..services.template_service import TemplateService
+from ..services.template_service import get_template_service
 from ..core.exceptions import TemplateSelectionError
 
 class GeminiTemplateSelector(TemplateSelector):
@@ -18,7 +18,7 @@ class GeminiTemplateSelector(TemplateSelector):
         """Initialize the template selection agent"""
         super().__init__()
         self.ai_service = GeminiService()
-        self.template_service = TemplateService()
+        self.template_service = get_template_service()
         
     async def execute(self, *args, **kwargs) -> str:
         """Execute the agent's primary function"""
@@ -50,7 +50,7 @@ class GeminiTemplateSelector(TemplateSelector):
                 raise TemplateSelectionError("No templates available")
             
             self.update_status("Evaluating templates", 0.6)
-            template = self.ai_service.select_template(
+            template = await self.ai_service.aselect_template(
                 campaign_intent=campaign_intent,
                 templates=templates
             )
@@ -36,7 +36,13 @@ class Assistant(ABC):
         return st.session_state[self.state_key]
     
     def update_state(self, **kwargs) -> None:
-        """Update this assistant's state with the provided key-value pairs."""
+        """
+        Update this assistant's state with the provided key-value pairs.
+        
+        Values are stored by reference in st.session_state and are never
+        serialized, so large payloads such as rendered email HTML are cheap
+        to keep here.
+        """
         state = self.get_state()
         state.update(kwargs)
     
@@ -5,14 +5,152 @@ This module provides the email assistant implementation that helps users
 create personalized marketing emails.
 """
 import asyncio
-import json
+import codecs
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 import streamlit as st
-from typing import Dict, Optional, List
+from streamlit.runtime.scriptrunner import ScriptRunContext, add_script_run_ctx, get_script_run_ctx
+from typing import Dict, Optional, Tuple
+
+try:
+    import orjson
+    
+    _json_loads = orjson.loads
+    
+    def _json_dumps_pretty(obj) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+except ImportError:
+    import json
+    
+    # json.loads also accepts bytes, so callers need not care which one is used
+    _json_loads = json.loads
+    
+    def _json_dumps_pretty(obj) -> str:
+        return json.dumps(obj, indent=2)
 
 from .base import Assistant
 from ..orchestration.orchestrator import EmailOrchestrator
-from ..core.state import add_message, get_contacts, set_contacts
+from ..core.state import add_message, get_contacts, set_contacts, start_campaign
 from ..core.exceptions import EmailCreationError
+from ..ui.page_utils import PREVIEW_HEIGHT
+
+# How long a rerun waits for an upload to parse before showing progress instead, in seconds
+PARSE_WAIT = 0.05
+
+# Example shown in the contact format help
+_CONTACT_FORMAT_EXAMPLE = """{
+  "contacts": [
+    {
+      "first_name": "John",
+      "last_name": "Doe",
+      "job_title": "Software Engineer",
+      "company": "Tech Corp",
+      "industry": "Technology"
+    }
+  ]
+}"""
+
+# Welcome instructions, emitted as one markdown element
+_WELCOME_MD = """### Getting Started:
+1. **Upload your contacts.json** file in the sidebar
+2. **Describe your campaign** or select an example below
+3. **Preview and refine** your personalized email
+
+Your emails will include AI-generated images and personalized content based on your contacts' information."""
+
+# Parses uploaded contact files off the script thread
+_PARSE_EXECUTOR = ThreadPoolExecutor(max_workers=2)
+
+@st.cache_data(show_spinner=False)
+def _parse_contacts(file_bytes: bytes) -> Optional[Tuple[Dict, ...]]:
+    """
+    Parse an uploaded contacts file; cached by content so reruns skip the parse
+    
+    Args:
+        file_bytes: Contents of the uploaded file
+        
+    Returns:
+        The contacts as a tuple, or None if the file is not shaped like
+        {"contacts": [...]}
+    """
+    # Editors on Windows often save JSON with a UTF-8 byte order mark
+    if file_bytes.startswith(codecs.BOM_UTF8):
+        file_bytes = file_bytes[len(codecs.BOM_UTF8):]
+    
+    # Anything but a JSON object is rejected without parsing the whole file
+    if file_bytes[:64].lstrip()[:1] != b'{':
+        return None
+    
+    contacts_data = _json_loads(file_bytes)
+    if not isinstance(contacts_data, dict) or not isinstance(contacts_data.get('contacts'), list):
+        return None
+    return tuple(contacts_data['contacts'])
+
+def _parse_in_worker(ctx: Optional[ScriptRunContext], file_bytes: bytes) -> Optional[Tuple[Dict, ...]]:
+    """
+    Run _parse_contacts on an executor thread
+    
+    st.cache_data expects a script run context on the calling thread, so the
+    context of the run that submitted the parse is attached first. Each task
+    attaches its own, so a context left on an idle pool thread is never used.
+    
+    Args:
+        ctx: Script run context of the submitting run
+        file_bytes: Contents of the uploaded file
+        
+    Returns:
+        The result of _parse_contacts
+    """
+    add_script_run_ctx(threading.current_thread(), ctx)
+    return _parse_contacts(file_bytes)
+
+def _submit_parse(file_bytes: bytes) -> Future:
+    """
+    Start parsing an uploaded contacts file in the background
+    
+    The future is kept in session state under the file's hash, so reruns
+    with the same upload reuse it instead of parsing again.
+    
+    Args:
+        file_bytes: Contents of the uploaded file
+        
+    Returns:
+        Future resolving to the result of _parse_contacts
+    """
+    file_hash = hashlib.blake2b(file_bytes, digest_size=8).hexdigest()
+    if st.session_state.get("_parse_hash") != file_hash:
+        st.session_state._parse_future = _PARSE_EXECUTOR.submit(
+            _parse_in_worker, get_script_run_ctx(), file_bytes
+        )
+        st.session_state._parse_hash = file_hash
+    return st.session_state._parse_future
+
+@st.fragment(run_every=0.2)
+def _render_parse_progress(future: Future) -> None:
+    """Show that an upload is being parsed, rerunning the app once it is done"""
+    if future.done():
+        st.rerun()
+    st.info("⏳ Reading contacts...")
+
+def _render_sample_contact(contact: Dict, cache_key: str) -> None:
+    """
+    Show a contact as formatted JSON in an expander
+    
+    Rendered as a code block, which is a single string for the frontend,
+    rather than st.json's interactive viewer. The serialized text is kept
+    in session state under cache_key so it is only built once per upload.
+    
+    Args:
+        contact: The contact to show
+        cache_key: Identifies the file the contact came from
+    """
+    cached = st.session_state.get("_sample_json")
+    if not cached or cached[0] != cache_key:
+        cached = (cache_key, _json_dumps_pretty(contact))
+        st.session_state._sample_json = cached
+    with st.expander("View Sample Contact", expanded=False):
+        st.code(cached[1], language="json")
 
 class EmailAssistant(Assistant):
     """Email assistant for creating personalized marketing emails."""
@@ -24,6 +162,15 @@ class EmailAssistant(Assistant):
         "Monthly Newsletter": "Create a monthly newsletter for our fitness app subscribers with workout tips, success stories, and upcoming features."
     }
     
+    # (button key, name, prompt) for each example, built once rather than per rerun
+    _EXAMPLE_ITEMS = tuple(
+        (f"example_{i}", name, prompt)
+        for i, (name, prompt) in enumerate(EXAMPLE_PROMPTS.items())
+    )
+    
+    # Relative widths of the example prompt columns; only the first three hold buttons
+    _EXAMPLE_COLUMN_RATIOS = (1, 1, 1, 2, 2)
+    
     def __init__(self):
         """Initialize the email assistant."""
         super().__init__(
@@ -49,92 +196,119 @@ class EmailAssistant(Assistant):
     
     def render_sidebar(self) -> None:
         """Render the email assistant sidebar with upload and sample data options."""
-        st.sidebar.subheader("Upload contacts to get started")
-        uploaded_file = st.sidebar.file_uploader("Upload Contacts", type=['json'], key="contact_uploader", label_visibility="collapsed")
+        with st.sidebar:
+            self._render_sidebar_body()
+    
+    @st.fragment
+    def _render_sidebar_body(self) -> None:
+        """
+        Render the sidebar contents as a fragment
+        
+        Sidebar widgets rerun only this fragment, and main-pane interactions
+        no longer rebuild the sidebar. Loading contacts reruns the whole app,
+        since the main pane depends on them.
+        """
+        st.subheader("Upload contacts to get started")
+        uploaded_file = st.file_uploader("Upload Contacts", type=['json'], key="contact_uploader", label_visibility="collapsed")
         contacts_loaded = 'contacts' in st.session_state and st.session_state.contacts
 
+        # Confirm sample data on the app rerun that follows loading it
+        sample_count = st.session_state.pop("_sample_loaded", None)
+        if sample_count is not None:
+            st.success(f"✅ {sample_count} sample contacts loaded successfully")
+            if sample_count > 0:
+                _render_sample_contact(get_contacts()[0], "sample_data")
+
         if not contacts_loaded:
-            if st.sidebar.button("✨ Use Sample Data", key="use_sample_data_sidebar"):
+            if st.button("✨ Use Sample Data", key="use_sample_data_sidebar"):
                 try:
-                    with open("data/contacts.json", "r") as f:
-                        contacts_data = json.load(f)
+                    with open("data/contacts.json", "rb") as f:
+                        contacts_data = _json_loads(f.read())
                     if not isinstance(contacts_data, dict) or 'contacts' not in contacts_data:
-                        st.sidebar.error("⚠️ Invalid format in sample data. Expected {'contacts': [...]}.")
+                        st.error("⚠️ Invalid format in sample data. Expected {'contacts': [...]}.")
                     else:
                         set_contacts(contacts_data['contacts'])
-                        contact_count = len(contacts_data['contacts'])
-                        st.sidebar.success(f"✅ {contact_count} sample contacts loaded successfully")
-                        if contact_count > 0:
-                            with st.sidebar.expander("View Sample Contact"):
-                                st.json(contacts_data['contacts'][0])
+                        st.session_state._sample_loaded = len(contacts_data['contacts'])
+                        st.rerun()
                 except Exception as e:
-                    st.sidebar.error(f"⚠️ Error loading sample contacts: {str(e)}")
+                    st.error(f"⚠️ Error loading sample contacts: {str(e)}")
 
         if uploaded_file:
-            try:
-                contacts_data = json.load(uploaded_file)
-                if not isinstance(contacts_data, dict) or 'contacts' not in contacts_data:
-                    st.sidebar.error("⚠️ Invalid format. Expected {'contacts': [...]}.")
-                else:
-                    contact_count = len(contacts_data['contacts'])
-                    st.sidebar.success(f"✅ {contact_count} contacts loaded successfully")
-                    st.session_state.contacts = contacts_data['contacts']
-                    if contact_count > 0:
-                        with st.sidebar.expander("View Sample Contact"):
-                            st.json(contacts_data['contacts'][0])
-            except Exception as e:
-                st.sidebar.error(f"⚠️ Error loading contacts: {str(e)}")
-
-        with st.sidebar.expander("📋 Contact Format Help"):
-            st.markdown("""
-            Your contacts.json file should have this structure:
-            ```json
-            {
-              "contacts": [
-                {
-                  "first_name": "John",
-                  "last_name": "Doe",
-                  "job_title": "Software Engineer",
-                  "company": "Tech Corp",
-                  "industry": "Technology"
-                }
-              ]
-            }
-            ```
-            """)
+            self._render_upload(uploaded_file)
+
+        # Once a preview has picked the template, generate the rest in the background
+        campaign_details = self.get_state()["campaign_details"]
+        campaign_running = st.session_state.get('campaign', {}).get('running')
+        if contacts_loaded and campaign_details.get("template") and not campaign_running:
+            if st.button("📨 Generate for all contacts", key="generate_all_contacts"):
+                start_campaign(
+                    get_contacts(),
+                    campaign_details["template"],
+                    campaign_details["intent"]
+                )
+                st.rerun()
+
+        with st.expander("📋 Contact Format Help"):
+            st.write("Your contacts.json file should have this structure:")
+            st.code(_CONTACT_FORMAT_EXAMPLE, language="json")
+    
+    def _render_upload(self, uploaded_file) -> None:
+        """Load contacts from an uploaded file and report the outcome in the sidebar."""
+        # Read the upload once; the hash, the parse and the checks all share it
+        file_bytes = uploaded_file.getvalue()
+        if not file_bytes:
+            st.error("⚠️ The uploaded file is empty.")
+            return
+        
+        future = _submit_parse(file_bytes)
+        # Small files finish almost at once; only show progress for slow ones
+        wait([future], timeout=PARSE_WAIT)
+        if not future.done():
+            _render_parse_progress(future)
+            return
+        
+        try:
+            contacts = future.result()
+            if contacts is None:
+                st.error("⚠️ Invalid format. Expected {'contacts': [...]}.")
+                return
+            st.success(f"✅ {len(contacts)} contacts loaded successfully")
+            if contacts:
+                _render_sample_contact(contacts[0], st.session_state._parse_hash)
+        except Exception as e:
+            st.error(f"⚠️ Error loading contacts: {str(e)}")
+            return
+        
+        # A newly loaded file changes the main pane, so rerun the whole app once
+        if st.session_state.get("_loaded_hash") != st.session_state._parse_hash:
+            set_contacts(contacts)
+            st.session_state._loaded_hash = st.session_state._parse_hash
+            st.rerun()
     
     def render_welcome(self) -> None:
         """Render the email assistant welcome message and instructions in the main area."""
         with st.container():
-            st.subheader("Getting Started:")
-            st.markdown("1. **Upload your contacts.json** file below")
-            st.markdown("2. **Describe your campaign** or select an example")
-            st.markdown("3. **Preview and refine** your personalized email")
-            st.write("Your emails will include AI-generated images and personalized content based on your contacts' information.")
+            st.markdown(_WELCOME_MD)
     
     def render_example_prompts(self) -> Optional[str]:
         """Render email assistant example prompts."""
-        state = self.get_state()
-        if state["current_step"] == 'welcome':
-            # Check if contacts exist in session state
-            contacts_exist = 'contacts' in st.session_state and st.session_state.contacts
-            
-            # Only show example prompts if contacts exist
-            if contacts_exist:
-                st.markdown("### Try one of these examples:")
-                
-                # Create a multi-column layout to control width - make columns narrower
-                col1, col2, col3, col4, col5 = st.columns([1, 1, 1, 2, 2])
-                
-                # Only use the first 3 columns for buttons, leaving the rest empty
-                # This makes each button column narrower
-                button_cols = [col1, col2, col3]
-                for i, (name, prompt) in enumerate(self.EXAMPLE_PROMPTS.items()):
-                    with button_cols[i]:
-                        # Add consistent styling to buttons
-                        if st.button(f"📝 {name}", key=f"example_{i}", help=prompt, 
-                                    use_container_width=True):
-                            return prompt
+        # Only show example prompts on the welcome step, once contacts exist
+        if self.get_state().get("current_step") != 'welcome' or not st.session_state.get("contacts"):
+            return None
+        
+        st.markdown("### Try one of these examples:")
+        
+        # Create a multi-column layout to control width - make columns narrower
+        columns = st.columns(self._EXAMPLE_COLUMN_RATIOS)
+        
+        # Only use the first 3 columns for buttons, leaving the rest empty
+        # This makes each button column narrower
+        for column, (key, name, prompt) in zip(columns, self._EXAMPLE_ITEMS):
+            with column:
+                # Add consistent styling to buttons
+                if st.button(f"📝 {name}", key=key, help=prompt, 
+                            use_container_width=True):
+                    return prompt
         return None
     
     def render_result(self, result: Dict) -> None:
@@ -146,8 +320,9 @@ class EmailAssistant(Assistant):
         preview_tab, code_tab = st.tabs(["Preview", "HTML Code"])
         
         with preview_tab:
-            # Render the HTML preview
-            st.components.v1.html(result['html'], height=800, scrolling=True)
+            # Render the HTML preview at a fixed height: an expand toggle would
+            # rerun the app, and this one-shot panel would not be redrawn
+            st.components.v1.html(result['html'], height=PREVIEW_HEIGHT, scrolling=True)
             
             # Add download button
             st.download_button(
@@ -158,8 +333,10 @@ class EmailAssistant(Assistant):
             )
         
         with code_tab:
-            # Show the HTML code with syntax highlighting
-            st.code(result['html'], language="html")
+            # Show the HTML code as plain text; highlighting a whole email is
+            # slow in the browser. A highlight toggle would not survive its own
+            # rerun, since this result is only rendered by process_prompt
+            st.text_area("HTML source", result['html'], height=800, disabled=True)
     
     async def process_prompt(self, prompt: str) -> None:
         """Process a user prompt and generate an email response."""
@@ -58,7 +58,52 @@ APP_SETTINGS = {
     "default_template": "welcome_email.html",
     "models": {
         "template_selection": "gemini-2.0-flash",
-        "content_generation": "gemini-2.0-flash"
+        "content_generation": "gemini-2.0-flash",
+        "image_generation": "imagen-3.0-generate-002",
+        "embedding": "text-embedding-004"
+    },
+    "cache": {
+        # Reuse model responses for identical (model, prompt) requests. Off by
+        # default: when enabled, regenerating with the same inputs returns the
+        # same content for ttl_seconds instead of a fresh variation, which
+        # suits development and repeated demos rather than real campaigns
+        "enabled": False,
+        "path": ".cache/llm_cache.db",
+        "ttl_seconds": 24 * 60 * 60
+    },
+    "apollo_cache": {
+        # Firmographic data changes slowly, so enrichment results keep for a week
+        "enabled": True,
+        "path": ".cache/apollo_cache.db",
+        "ttl_seconds": 7 * 24 * 60 * 60
+    },
+    "image_cache": {
+        "enabled": True,
+        "directory": ".cache/images",
+        # Reuse an image generated for a near-identical prompt
+        "semantic": True,
+        "similarity_threshold": 0.97,
+        # Variants to request for the hero image on a cache miss; the extras
+        # are served to later, similar campaigns at no extra cost
+        "hero_variants": 2
+    },
+    "images": {
+        # Embed images in the HTML as base64 data URLs, so the email works as a
+        # standalone download. When False, images are written to static_dir and
+        # referenced by URL, which keeps the HTML small but requires Streamlit's
+        # static file serving (server.enableStaticServing).
+        "inline": True,
+        "static_dir": "static/generated",
+        # Streamlit's URL for static_dir, relative to server.baseUrlPath
+        "url_prefix": "app/static/generated"
+    },
+    "templates": {
+        # Templates are not reloaded when edited; restart the app to pick up changes
+        "auto_reload": False,
+        # Compiled templates, reused across processes
+        "bytecode_cache_dir": ".cache/jinja",
+        # Extracted template metadata, reused until a template file changes
+        "metadata_cache_path": ".cache/template_meta.json"
     }
 }
 
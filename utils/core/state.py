@@ -1,6 +1,9 @@
 """Session state management utilities for shared application state"""
+import queue
+import threading
 import streamlit as st
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Sequence, Tuple
+from .config import get_api_key
 
 def initialize_session_state():
     """Initialize shared session state variables"""
@@ -19,10 +22,87 @@ def add_message(role: str, content: str, html: Optional[str] = None):
         message["html"] = html
     st.session_state.messages.append(message)
 
-def get_contacts() -> List[Dict]:
+def get_contacts() -> Optional[Tuple[Dict, ...]]:
     """Get the loaded contacts or return None"""
     return st.session_state.contacts
 
-def set_contacts(contacts: List[Dict]):
-    """Set the contacts in session state"""
-    st.session_state.contacts = contacts
\ No newline at end of file
+def set_contacts(contacts: Sequence[Dict]):
+    """Set the contacts in session state, stored as a tuple since they are never edited"""
+    st.session_state.contacts = tuple(contacts)
+
+def start_campaign(contacts: Sequence[Dict], template: str, campaign_purpose: str):
+    """
+    Generate emails for all contacts on a background thread
+    
+    The worker never touches session state; it reports through a queue of
+    (contact, html or exception) results, followed by None when it is done.
+    A campaign that fails as a whole reports (None, exception).
+    Progress is read back with get_campaign_progress.
+    
+    Args:
+        contacts: Contacts to generate emails for
+        template: Name of the template to render
+        campaign_purpose: Description of the campaign purpose
+    """
+    results: queue.Queue = queue.Queue()
+    st.session_state.campaign = {
+        'queue': results,
+        'total': len(contacts),
+        'completed': [],
+        'running': True,
+    }
+    
+    thread = threading.Thread(
+        target=_run_campaign,
+        args=(results, list(contacts), template, campaign_purpose),
+        daemon=True
+    )
+    thread.start()
+
+def get_campaign_progress() -> Optional[Dict]:
+    """
+    Collect the results the campaign worker has produced since the last call
+    
+    Returns:
+        The campaign state, with 'completed' holding every (contact, result)
+        pair so far and 'running' cleared once the worker has finished, or
+        None if no campaign has been started
+    """
+    campaign = st.session_state.get('campaign')
+    if not campaign:
+        return None
+    
+    while True:
+        try:
+            item = campaign['queue'].get_nowait()
+        except queue.Empty:
+            break
+        if item is None:
+            campaign['running'] = False
+        else:
+            campaign['completed'].append(item)
+    
+    return campaign
+
+def _run_campaign(results: queue.Queue, contacts: List[Dict], template: str, campaign_purpose: str):
+    """Campaign worker: run the pipeline for every contact and report through the queue"""
+    # Imported here so session state helpers stay free of service dependencies
+    from ..services.ai_service import GeminiService
+    from ..services.apollo import ApolloClient
+    
+    try:
+        # Enrichment is optional; without an Apollo key contacts are used as uploaded
+        enricher = ApolloClient() if get_api_key("APOLLO_API_KEY") else None
+        try:
+            for contact, result in GeminiService().process_contacts(
+                contacts, template, campaign_purpose, enricher=enricher
+            ):
+                results.put((contact, result))
+        finally:
+            if enricher:
+                enricher.close()
+    except Exception as e:
+        # The campaign failed as a whole, e.g. while generating its images
+        results.put((None, e))
+    finally:
+        results.put(None)
@@ -2,21 +2,40 @@ from typing import Dict, Any
 import asyncio
 import streamlit as st
 from ..agents import EmailTemplateSelector, EmailContentGenerator, EmailHtmlCompiler
+from ..services.template_service import get_template_service
 from ..core.exceptions import EmailCreationError
 from ..assistants.base import Assistant
 
+# Minimum time between status display writes, in seconds
+STATUS_FLUSH_INTERVAL = 0.1
+
 class EmailOrchestrator:
     def __init__(self):
         self.template_selector = EmailTemplateSelector()
         self.content_generator = EmailContentGenerator()
         self.html_compiler = EmailHtmlCompiler()
+        self.template_service = get_template_service()
         self._status_containers: Dict[str, Dict] = {}
         
     def _update_status_display(self, agent_name: str, status: str, progress: float):
-        """Update the status display for an agent"""
+        """Queue a status update for an agent; it is written on the next flush"""
         if agent_name in self._status_containers:
-            self._status_containers[agent_name]['status'].text(status)
-            self._status_containers[agent_name]['progress'].progress(progress)
+            self._status_containers[agent_name]['pending'] = (status, progress)
+    
+    def _flush_status_displays(self):
+        """Write any pending status updates to the Streamlit widgets"""
+        for containers in self._status_containers.values():
+            pending = containers.pop('pending', None)
+            if pending:
+                status, progress = pending
+                containers['status'].text(status)
+                containers['progress'].progress(progress)
+    
+    async def _flush_status_loop(self):
+        """Flush status updates at a bounded rate while agents are running"""
+        while True:
+            self._flush_status_displays()
+            await asyncio.sleep(STATUS_FLUSH_INTERVAL)
     
     def setup_status_displays(self):
         """Create and store status display containers"""
@@ -65,6 +84,7 @@ class EmailOrchestrator:
             contact: The contact to use for personalization
             assistant: The assistant instance for state management
         """
+        flush_task = None
         try:
             # Set up status callbacks for each agent
             self.template_selector.set_status_callback(
@@ -77,29 +97,40 @@ class EmailOrchestrator:
                 lambda status, progress: self._update_status_display('compilation', status, progress)
             )
             
+            # Agents may report status many times a second; coalesce the
+            # updates so the widgets are only written at a bounded rate
+            flush_task = asyncio.create_task(self._flush_status_loop())
+            
             # Get the assistant's state
             state = assistant.get_state()
             campaign_details = state.get("campaign_details", {})
             
-            # Start template selection and content generation in parallel
+            # Start template selection in the background; it only needs the intent
             template_task = asyncio.create_task(
                 self._select_template(campaign_intent)
             )
-            content_task = asyncio.create_task(
-                self._generate_content(contact, campaign_intent)
+            
+            # Image prompts depend only on the content, so start generating
+            # images as soon as it is ready instead of waiting for the template
+            try:
+                content = await self._generate_content(contact, campaign_intent)
+            except Exception:
+                template_task.cancel()
+                raise
+            images_task = asyncio.create_task(
+                self._generate_images(content)
             )
             
-            # Wait for both to complete
-            template, content = await asyncio.gather(template_task, content_task)
+            template, images = await asyncio.gather(template_task, images_task)
             
             # Update campaign details in the assistant's state
             campaign_details.update({
                 'template': template,
-                'content': content
+                'content': {**content, **images}
             })
             
-            # Once we have both, start compilation
-            html = await self._compile_html(template, content)
+            # Once we have everything, render the final email
+            html = await self._render_html(template, content, images)
             
             # Store final HTML in the assistant's state
             campaign_details['html'] = html
@@ -109,21 +140,24 @@ class EmailOrchestrator:
             
             return {
                 'template': template,
-                'content': content,
+                'content': campaign_details['content'],
                 'html': html
             }
             
         except Exception as e:
             st.error(f"Error creating email: {str(e)}")
             raise
+        finally:
+            if flush_task:
+                flush_task.cancel()
+            # Make sure the final status of every agent is shown
+            self._flush_status_displays()
     
     async def _select_template(self, campaign_intent: str) -> str:
         """Run template selection with status updates"""
         try:
             # Get available templates from the template service instead of hardcoding
-            from ..services.template_service import TemplateService
-            template_service = TemplateService()
-            available_templates = template_service.get_available_templates()
+            available_templates = self.template_service.get_available_templates()
             
             if not available_templates:
                 raise EmailCreationError("No templates found in the templates directory")
@@ -147,13 +181,18 @@ class EmailOrchestrator:
             self._update_status_display('content', f"Error: {str(e)}", 1.0)
             raise EmailCreationError(f"Content generation failed: {str(e)}")
     
-    async def _compile_html(self, template: str, content: Dict) -> str:
+    async def _generate_images(self, content: Dict) -> Dict[str, str]:
+        """Run image generation with status updates"""
+        try:
+            return await self.html_compiler.generate_images(content)
+        except Exception as e:
+            self._update_status_display('compilation', f"Error: {str(e)}", 1.0)
+            raise EmailCreationError(f"Image generation failed: {str(e)}")
+    
+    async def _render_html(self, template: str, content: Dict, images: Dict[str, str]) -> str:
         """Run email compilation with status updates"""
         try:
-            return await self.html_compiler.execute(
-                template=template,
-                content=content
-            )
+            return await self.html_compiler.render(template, content, images)
         except Exception as e:
             self._update_status_display('compilation', f"Error: {str(e)}", 1.0)
-            raise EmailCreationError(f"HTML compilation failed: {str(e)}") 
\ No newline at end of file
+            raise EmailCreationError(f"HTML compilation failed: {str(e)}")
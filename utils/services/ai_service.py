@@ -4,13 +4,72 @@ AI Service for the Email Creation application.
 This module provides a unified interface for AI-related functionality,
 abstracting away the details of specific AI providers.
 """
-import json
-from typing import Dict, List, Optional
-from google import genai
-from google.genai import types
+import asyncio
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+import httpx
+from google.genai import errors, types
+import orjson
 import base64
 from ..core.config import get_api_key, get_app_setting
 from ..core.exceptions import AIServiceError, ContentGenerationError
+from .image_cache import ImageCache, get_image_cache
+from .apollo import ApolloClient
+from .gemini_client import get_gemini_client
+from .image_processing import PLACEHOLDER_IMAGE_URL, optimize_image
+from .llm_cache import LLMCache
+from .template_service import TemplateService, get_template_service
+
+logger = logging.getLogger(__name__)
+
+# Fields every generated email content object must contain
+REQUIRED_CONTENT_KEYS = {
+    'subject', 'preheader', 'headline', 'subheadline', 'welcome_message',
+    'company_name', 'feature1_title', 'feature1_text', 'feature2_title',
+    'feature2_text', 'highlight_title', 'highlight_text', 'cta_headline',
+    'cta_text'
+}
+
+# Static instructions for content generation. Sent as the system instruction
+# so it forms an identical prefix on every request, which the provider can
+# reuse between calls; only the contacts and campaign vary per request.
+CONTENT_SYSTEM_PROMPT = """
+Generate personalized email content for each of the contacts given for a campaign.
+
+IMPORTANT: Do NOT use placeholders like [Your Company Name] or [Your Software Name] in your response.
+Instead, use specific, relevant names based on the campaign purpose. For example, if it's a software product,
+give it a specific name like "Streamline Pro" or "TaskMaster". If it's for a company, use the actual company
+name from the contact information or create a specific, realistic company name.
+
+For each contact, generate a JSON object with the following fields:
+- contact: The number of the contact in the list, as an integer
+- subject: Compelling, personalized subject line with the contact's name and without placeholders
+- preheader: Preview text that appears in email clients, without placeholders
+- headline: Main email heading that includes the contact's name and company, without placeholders
+- subheadline: Supporting text under headline, without placeholders
+- welcome_message: Personalized welcome paragraph that mentions the contact's name, job title, and company, without placeholders
+- company_name: Use the sender's company name based on the campaign purpose (not the contact's company), without placeholders
+- feature1_title: First feature heading, without placeholders
+- feature1_text: First feature description, without placeholders
+- feature2_title: Second feature heading, without placeholders
+- feature2_text: Second feature description, without placeholders
+- highlight_title: Special highlight section heading, without placeholders
+- highlight_text: Special highlight description, without placeholders
+- cta_headline: Call to action section heading, without placeholders
+- cta_text: Action-oriented button text, without placeholders
+
+Make the content professional, engaging, and personalized to each contact's role and industry.
+Return ONLY a JSON array with one object per contact, with no additional text or formatting.
+""".strip()
+
+# Contacts whose content is generated in one request during a campaign
+CONTENT_BATCH_SIZE = 5
+
+# Images generated for each email (hero, two features and highlight)
+IMAGES_PER_EMAIL = 4
 
 class AIService:
     """Base class for AI services"""
@@ -21,7 +80,14 @@ class AIService:
 
 
 class GeminiService(AIService):
-    """Service for interacting with Google's Gemini AI"""
+    """
+    Service for interacting with Google's Gemini AI
+    
+    The async methods run the synchronous client on a worker thread rather
+    than using client.aio: the shared client's async HTTP pool stays bound to
+    the first event loop that uses it, and app.py runs every prompt on a new
+    loop with asyncio.run.
+    """
     
     def __init__(self, api_key: Optional[str] = None):
         """Initialize the Gemini service with an API key"""
@@ -31,7 +97,26 @@ class GeminiService(AIService):
         if not api_key:
             raise AIServiceError("API key is required", self.service_name)
         
-        self.client = genai.Client(api_key=api_key)
+        self.client = get_gemini_client(api_key)
+        
+        # Built once so every content request carries the same static prefix
+        self._content_config = types.GenerateContentConfig(
+            system_instruction=CONTENT_SYSTEM_PROMPT
+        )
+        
+        self.llm_cache: Optional[LLMCache] = None
+        if get_app_setting("cache.enabled"):
+            self.llm_cache = LLMCache(
+                get_app_setting("cache.path"),
+                get_app_setting("cache.ttl_seconds")
+            )
+        
+        self.image_cache: Optional[ImageCache] = None
+        if get_app_setting("image_cache.enabled"):
+            self.image_cache = get_image_cache(
+                get_app_setting("image_cache.directory"),
+                get_app_setting("image_cache.similarity_threshold")
+            )
     
     def select_template(self, campaign_intent: str, templates: List[str]) -> str:
         """
@@ -44,6 +129,52 @@ class GeminiService(AIService):
         Returns:
             Name of the selected template
         """
+        prompt = self._build_template_prompt(campaign_intent, templates)
+        
+        # Get model from configuration
+        model = get_app_setting("models.template_selection")
+        
+        def fetch() -> str:
+            # Generate content using configured model
+            response = self.client.models.generate_content(
+                model=model,
+                contents=prompt
+            )
+            return response.text
+        
+        try:
+            if self.llm_cache:
+                text = self.llm_cache.get_or_set(self.llm_cache.make_key(model, prompt), fetch)
+            else:
+                text = fetch()
+            return text.strip()
+        except Exception as e:
+            raise AIServiceError(f"Template selection failed: {str(e)}", self.service_name)
+    
+    async def aselect_template(self, campaign_intent: str, templates: List[str]) -> str:
+        """
+        Select the best template for an email campaign without blocking the event loop
+        
+        Args:
+            campaign_intent: Description of the campaign's purpose and goals
+            templates: List of available template names
+            
+        Returns:
+            Name of the selected template
+        """
+        return await asyncio.to_thread(self.select_template, campaign_intent, templates)
+    
+    def _build_template_prompt(self, campaign_intent: str, templates: List[str]) -> str:
+        """
+        Build the template selection prompt
+        
+        Args:
+            campaign_intent: Description of the campaign's purpose and goals
+            templates: List of available template names
+            
+        Returns:
+            The prompt text
+        """
         # Create a mapping of template types to descriptions for better selection
         template_descriptions = {
             'welcome/welcome_email.html': 'Welcome email for new customers or users, focused on onboarding and introduction to services/products',
@@ -65,7 +196,7 @@ class GeminiService(AIService):
                 template_descriptions[template] = f"{name.replace('_', ' ').title()} email in the {category} category"
         
         # Build a more informative prompt with template descriptions
-        prompt = f"""
+        return f"""
         Select the most appropriate email template for the following campaign:
         
         Campaign Intent:
@@ -82,28 +213,161 @@ class GeminiService(AIService):
         
         Return only the exact template name (including folder path) that would be most effective.
         """
+    
+    def generate_email_content(
+        self,
+        contact: Dict,
+        template: str,
+        campaign_purpose: str
+    ) -> Dict[str, str]:
+        """
+        Generate personalized email content for a contact
+        
+        Args:
+            contact: Dictionary containing contact information
+            template: Name of the selected template
+            campaign_purpose: Description of the campaign purpose
+            
+        Returns:
+            Dictionary containing generated content fields
+        """
+        return self.generate_email_content_batch([contact], template, campaign_purpose)[0]
+    
+    def generate_email_content_batch(
+        self,
+        contacts: List[Dict],
+        template: str,
+        campaign_purpose: str
+    ) -> List[Dict[str, str]]:
+        """
+        Generate personalized email content for several contacts in one request
+        
+        Args:
+            contacts: List of dictionaries containing contact information
+            template: Name of the selected template
+            campaign_purpose: Description of the campaign purpose
+            
+        Returns:
+            List of dictionaries containing generated content fields, in the
+            same order as the contacts, matched by the contact number in each item
+        """
+        prompt = self._build_content_prompt(contacts, template, campaign_purpose)
         
         # Get model from configuration
-        model = get_app_setting("models.template_selection")
+        model = get_app_setting("models.content_generation")
+        
+        key = self.llm_cache.make_key(model, CONTENT_SYSTEM_PROMPT, prompt) if self.llm_cache else None
+        text = self.llm_cache.get(key) if self.llm_cache else None
+        cached = text is not None
         
+        if not cached:
+            try:
+                # Generate content using configured model
+                response = self.client.models.generate_content(
+                    model=model,
+                    contents=prompt,
+                    config=self._content_config
+                )
+                text = response.text
+            except Exception as e:
+                raise AIServiceError(f"Content generation failed: {str(e)}", self.service_name)
+        
+        return self._parse_and_cache_contents(text, len(contacts), key, cached)
+    
+    def generate_email_content_stream(
+        self,
+        contact: Dict,
+        template: str,
+        campaign_purpose: str
+    ) -> Iterator[str]:
+        """
+        Generate personalized email content for a contact, yielding the raw
+        response text as it arrives
+        
+        Join the chunks and pass the result to parse_email_content once the
+        stream is exhausted.
+        
+        Args:
+            contact: Dictionary containing contact information
+            template: Name of the selected template
+            campaign_purpose: Description of the campaign purpose
+            
+        Yields:
+            Chunks of the response text
+        """
+        prompt = self._build_content_prompt([contact], template, campaign_purpose)
+        model = get_app_setting("models.content_generation")
+        
+        key = self.llm_cache.make_key(model, CONTENT_SYSTEM_PROMPT, prompt) if self.llm_cache else None
+        cached = self.llm_cache.get(key) if self.llm_cache else None
+        if cached is not None:
+            yield cached
+            return
+        
+        chunks = []
         try:
-            # Generate content using configured model
-            response = self.client.models.generate_content(
+            for chunk in self.client.models.generate_content_stream(
                 model=model,
-                contents=prompt
-            )
-            return response.text.strip()
+                contents=prompt,
+                config=self._content_config
+            ):
+                if chunk.text:
+                    chunks.append(chunk.text)
+                    yield chunk.text
         except Exception as e:
-            raise AIServiceError(f"Template selection failed: {str(e)}", self.service_name)
+            raise AIServiceError(f"Content generation failed: {str(e)}", self.service_name)
+        
+        self._cache_if_valid(key, "".join(chunks))
     
-    def generate_email_content(
+    async def agenerate_email_content_stream(
+        self,
+        contact: Dict,
+        template: str,
+        campaign_purpose: str
+    ) -> AsyncIterator[str]:
+        """
+        Generate personalized email content for a contact without blocking the
+        event loop, yielding the raw response text as it arrives
+        
+        Args:
+            contact: Dictionary containing contact information
+            template: Name of the selected template
+            campaign_purpose: Description of the campaign purpose
+            
+        Yields:
+            Chunks of the response text
+        """
+        chunks = self.generate_email_content_stream(contact, template, campaign_purpose)
+        while True:
+            # Each chunk is waited for on a worker thread
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    
+    def parse_email_content(self, text: str) -> Dict[str, str]:
+        """
+        Parse the complete text of a streamed content response
+        
+        Args:
+            text: The joined chunks from generate_email_content_stream
+            
+        Returns:
+            Dictionary containing generated content fields
+        """
+        try:
+            return self._parse_email_contents(text, 1)[0]
+        except (orjson.JSONDecodeError, ValueError) as e:
+            raise ContentGenerationError(f"Error parsing Gemini response: {str(e)}. Raw response: {text}")
+    
+    async def agenerate_email_content(
         self,
         contact: Dict,
         template: str,
         campaign_purpose: str
     ) -> Dict[str, str]:
         """
-        Generate personalized email content for a contact
+        Generate personalized email content for a contact without blocking the event loop
         
         Args:
             contact: Dictionary containing contact information
@@ -113,114 +377,715 @@ class GeminiService(AIService):
         Returns:
             Dictionary containing generated content fields
         """
-        prompt = f"""
-        Generate personalized email content for the following contact and campaign:
-        
-        Contact:
-        - Name: {contact.get('first_name', '')}
-        - Job Title: {contact.get('job_title', '')}
-        - Company: {contact.get('company', '')}
-        - Industry: {contact.get('industry', '')}
-        
-        Template: {template}
-        Campaign Purpose: {campaign_purpose}
-        
-        IMPORTANT: Do NOT use placeholders like [Your Company Name] or [Your Software Name] in your response. 
-        Instead, use specific, relevant names based on the campaign purpose. For example, if it's a software product, 
-        give it a specific name like "Streamline Pro" or "TaskMaster". If it's for a company, use the actual company 
-        name from the contact information or create a specific, realistic company name.
-        
-        Generate a JSON object with the following fields:
-        - subject: Compelling, personalized subject line with the contact's name and without placeholders
-        - preheader: Preview text that appears in email clients, without placeholders
-        - headline: Main email heading that includes the contact's name and company, without placeholders
-        - subheadline: Supporting text under headline, without placeholders
-        - welcome_message: Personalized welcome paragraph that mentions the contact's name, job title, and company, without placeholders
-        - company_name: Use the sender's company name based on the campaign purpose (not the contact's company), without placeholders
-        - feature1_title: First feature heading, without placeholders
-        - feature1_text: First feature description, without placeholders
-        - feature2_title: Second feature heading, without placeholders
-        - feature2_text: Second feature description, without placeholders
-        - highlight_title: Special highlight section heading, without placeholders
-        - highlight_text: Special highlight description, without placeholders
-        - cta_headline: Call to action section heading, without placeholders
-        - cta_text: Action-oriented button text, without placeholders
-        
-        Make the content professional, engaging, and personalized to the contact's role and industry.
-        Return ONLY the JSON object with no additional text or formatting.
+        contents = await self.agenerate_email_content_batch([contact], template, campaign_purpose)
+        return contents[0]
+    
+    async def agenerate_email_content_batch(
+        self,
+        contacts: List[Dict],
+        template: str,
+        campaign_purpose: str
+    ) -> List[Dict[str, str]]:
         """
+        Generate personalized email content for several contacts in one request
+        without blocking the event loop
         
-        # Get model from configuration
-        model = get_app_setting("models.content_generation")
+        Args:
+            contacts: List of dictionaries containing contact information
+            template: Name of the selected template
+            campaign_purpose: Description of the campaign purpose
+            
+        Returns:
+            List of dictionaries containing generated content fields, in the
+            same order as the contacts
+        """
+        return await asyncio.to_thread(
+            self.generate_email_content_batch, contacts, template, campaign_purpose
+        )
+    
+    async def generate_email_content_many(
+        self,
+        contacts: List[Dict],
+        template: str,
+        campaign_purpose: str,
+        max_concurrency: int = 8
+    ) -> List[Union[Dict[str, str], Exception]]:
+        """
+        Generate personalized email content for many contacts concurrently
+        
+        Args:
+            contacts: List of dictionaries containing contact information
+            template: Name of the selected template
+            campaign_purpose: Description of the campaign purpose
+            max_concurrency: Maximum number of requests in flight, to stay
+                             within the API rate limits
+            
+        Returns:
+            List with, for each contact in order, either its generated
+            content or the exception raised while generating it
+        """
+        # Created per call: a semaphore is bound to the event loop it is used on
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def generate(contact: Dict) -> Dict[str, str]:
+            async with semaphore:
+                return await self.agenerate_email_content(contact, template, campaign_purpose)
+        
+        return await asyncio.gather(
+            *[generate(contact) for contact in contacts],
+            return_exceptions=True
+        )
+    
+    def process_contacts(
+        self,
+        contacts: List[Dict],
+        template: str,
+        campaign_purpose: str,
+        max_workers: int = 8,
+        batch_size: int = CONTENT_BATCH_SIZE,
+        enricher: Optional[ApolloClient] = None,
+        template_service: Optional[TemplateService] = None
+    ) -> Iterator[Tuple[Dict, Union[str, Exception]]]:
+        """
+        Run the full email pipeline for many contacts in parallel threads
         
+        With an enricher, the contacts are first enriched together through
+        Apollo's bulk match endpoint. Content is then generated for batch_size
+        contacts per request, and each email is rendered with the campaign's
+        shared images. The batches are network-bound, so they overlap.
+        
+        Args:
+            contacts: List of dictionaries containing contact information
+            template: Name of the template to render
+            campaign_purpose: Description of the campaign purpose
+            max_workers: Maximum number of batches processed at once
+            batch_size: Number of contacts whose content is generated per request
+            enricher: Optional Apollo client used to enrich the contacts first
+            template_service: Template service to render with; the shared
+                              one is used if not given
+            
+        Yields:
+            (contact, result) pairs in completion order, where result is the
+            rendered HTML or the exception that stopped that contact
+        """
+        template_service = template_service or get_template_service()
+        if enricher:
+            contacts = enricher.enrich_contacts(list(contacts))
+        
+        # The images depend only on the campaign, so every contact shares them
+        images = self.generate_campaign_images(template, campaign_purpose)
+        
+        batches = [contacts[i:i + batch_size] for i in range(0, len(contacts), batch_size)]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(
+                    self._process_batch, batch, template, campaign_purpose,
+                    template_service, images
+                ): batch
+                for batch in batches
+            }
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    results = future.result()
+                except Exception as e:
+                    results = [e] * len(batch)
+                yield from zip(batch, results)
+    
+    def _process_batch(
+        self,
+        batch: List[Dict],
+        template: str,
+        campaign_purpose: str,
+        template_service: TemplateService,
+        images: Dict[str, str]
+    ) -> List[Union[str, Exception]]:
+        """
+        Run the email pipeline for one batch of contacts
+        
+        A batch whose response cannot be parsed is retried one contact at a
+        time, so one malformed entry does not fail the whole batch.
+        
+        Args:
+            batch: Dictionaries containing contact information
+            template: Name of the template to render
+            campaign_purpose: Description of the campaign purpose
+            template_service: Template service to render with
+            images: The campaign's images, keyed by placeholder
+            
+        Returns:
+            For each contact in order, the rendered email HTML or the
+            exception that stopped it
+        """
         try:
-            # Generate content using configured model
-            response = self.client.models.generate_content(
-                model=model,
-                contents=prompt
-            )
+            contents = self.generate_email_content_batch(batch, template, campaign_purpose)
+        except ContentGenerationError:
+            contents = []
+            for contact in batch:
+                try:
+                    contents.append(self.generate_email_content(contact, template, campaign_purpose))
+                except Exception as e:
+                    contents.append(e)
+        
+        results: List[Union[str, Exception]] = []
+        for content in contents:
+            if isinstance(content, Exception):
+                results.append(content)
+                continue
+            try:
+                results.append(template_service.render_template(template, {**content, **images}))
+            except Exception as e:
+                results.append(e)
+        return results
+    
+    def generate_campaign_images(self, template: str, campaign_purpose: str) -> Dict[str, str]:
+        """
+        Generate the images for a campaign, shared by every contact's email
+        
+        The prompts depend only on the template and campaign purpose, so a
+        campaign that is run again is served from the image cache.
+        
+        Args:
+            template: Name of the template to render
+            campaign_purpose: Description of the campaign purpose
             
-            # Clean up the response text to handle markdown code blocks
-            text = response.text.strip()
-            if text.startswith('```'):
-                # Remove the first line (```json or similar)
-                text = text.split('\n', 1)[1]
-            if text.endswith('```'):
-                # Remove the last line (```)
-                text = text.rsplit('\n', 1)[0]
-            
-            # Parse the cleaned JSON
-            content = json.loads(text)
-            
-            required_keys = {
-                'subject', 'preheader', 'headline', 'subheadline', 'welcome_message',
-                'company_name', 'feature1_title', 'feature1_text', 'feature2_title',
-                'feature2_text', 'highlight_title', 'highlight_text', 'cta_headline',
-                'cta_text'
+        Returns:
+            Dictionary of image placeholders and their image URLs
+        """
+        hero_variants = get_app_setting("image_cache.hero_variants") or 1
+        prompts = build_campaign_image_prompts(template, campaign_purpose)
+        subjects = build_campaign_image_subjects(template, campaign_purpose)
+        
+        # The images are independent of each other, so request them together
+        with ThreadPoolExecutor(max_workers=IMAGES_PER_EMAIL) as executor:
+            futures = {
+                name: executor.submit(
+                    self.generate_image,
+                    prompt,
+                    number_of_images=hero_variants if name == 'HERO_IMAGE' else 1,
+                    slot=name,
+                    subject=subjects[name]
+                )
+                for name, prompt in prompts.items()
             }
+            return {name: future.result() for name, future in futures.items()}
+    
+    def _build_content_prompt(
+        self,
+        contacts: List[Dict],
+        template: str,
+        campaign_purpose: str
+    ) -> str:
+        """
+        Build the content generation prompt for one or more contacts
+        
+        Args:
+            contacts: List of dictionaries containing contact information
+            template: Name of the selected template
+            campaign_purpose: Description of the campaign purpose
             
-            if not all(key in content for key in required_keys):
-                missing_keys = required_keys - set(content.keys())
-                raise ValueError(f"Missing required content fields: {missing_keys}")
-                
-            return content
+        Returns:
+            The per-request user message; the instructions are sent separately
+            as CONTENT_SYSTEM_PROMPT
+        """
+        contact_list = "\n".join(
+            f"""{i}. Name: {contact.get('first_name', '')}
+   Job Title: {contact.get('job_title', '')}
+   Company: {contact.get('company', '')}
+   Industry: {contact.get('industry', '')}"""
+            for i, contact in enumerate(contacts, start=1)
+        )
+        
+        # Only the contact details vary; the instructions and field schema
+        # live in CONTENT_SYSTEM_PROMPT so every request shares the same prefix
+        return f"""Contacts:
+{contact_list}
+
+Template: {template}
+Campaign Purpose: {campaign_purpose}
+"""
+    
+    def _parse_and_cache_contents(
+        self,
+        text: str,
+        expected_count: int,
+        key: Optional[str],
+        cached: bool
+    ) -> List[Dict[str, str]]:
+        """
+        Parse a content generation response and cache it once it is known to be valid
+        
+        Args:
+            text: Raw response text
+            expected_count: Number of contacts the response should cover
+            key: Cache key of the request, or None when caching is disabled
+            cached: Whether the text came from the cache
             
-        except (json.JSONDecodeError, ValueError) as e:
+        Returns:
+            List of validated content dictionaries
+        """
+        try:
+            contents = self._parse_email_contents(text, expected_count)
+        except (orjson.JSONDecodeError, ValueError) as e:
             # Raise a more specific exception with context
-            raise ContentGenerationError(f"Error parsing Gemini response: {str(e)}. Raw response: {response.text}")
-        except Exception as e:
-            raise AIServiceError(f"Content generation failed: {str(e)}", self.service_name)
+            raise ContentGenerationError(f"Error parsing Gemini response: {str(e)}. Raw response: {text}")
+        
+        # Only cache responses that parsed, so a bad one is not replayed
+        if key and not cached:
+            self.llm_cache.set(key, text)
+        return contents
+    
+    def _cache_if_valid(self, key: Optional[str], text: str) -> None:
+        """Cache a streamed content response if it parses, leaving errors to the consumer"""
+        if not key:
+            return
+        try:
+            self._parse_email_contents(text, 1)
+        except (orjson.JSONDecodeError, ValueError):
+            return
+        self.llm_cache.set(key, text)
     
-    def generate_image(self, prompt: str) -> str:
+    @staticmethod
+    def _parse_email_contents(text: str, expected_count: int) -> List[Dict[str, str]]:
+        """
+        Parse and validate a content generation response
+        
+        Args:
+            text: Raw response text, possibly wrapped in a markdown code block
+            expected_count: Number of contacts the response should cover
+            
+        Returns:
+            List of validated content dictionaries, ordered by the contact
+            number each item carries
+        """
+        # Clean up the response text to handle markdown code blocks
+        text = text.strip()
+        if text.startswith('```'):
+            # Remove the first line (```json or similar)
+            parts = text.split('\n', 1)
+            if len(parts) < 2:
+                raise ValueError("Response contains only a code fence")
+            text = parts[1]
+        if text.endswith('```'):
+            # Remove the last line (```)
+            text = text.rsplit('\n', 1)[0]
+        
+        # Parse the cleaned JSON
+        contents = orjson.loads(text)
+        
+        # A single contact may come back as a bare object instead of an array
+        if isinstance(contents, dict):
+            contents = [contents]
+        
+        if not isinstance(contents, list) or len(contents) != expected_count:
+            raise ValueError(f"Expected a JSON array of {expected_count} content objects")
+        
+        ordered: List[Optional[Dict[str, str]]] = [None] * expected_count
+        for content in contents:
+            if not isinstance(content, dict):
+                raise ValueError("Expected each content item to be a JSON object")
+            missing_keys = REQUIRED_CONTENT_KEYS - set(content.keys())
+            if missing_keys:
+                raise ValueError(f"Missing required content fields: {missing_keys}")
+            
+            # Match items to contacts by the number they carry rather than by
+            # position; a lone item may omit it since there is nothing to mix up
+            number = content.pop('contact', None)
+            if number is None and expected_count == 1:
+                number = 1
+            if not isinstance(number, int) or isinstance(number, bool) or not 1 <= number <= expected_count:
+                raise ValueError(f"Content item has an invalid contact number: {number!r}")
+            if ordered[number - 1] is not None:
+                raise ValueError(f"Duplicate content for contact {number}")
+            ordered[number - 1] = content
+        
+        return ordered
+    
+    def generate_image(
+        self,
+        prompt: str,
+        number_of_images: int = 1,
+        photographic: bool = True,
+        slot: Optional[str] = None,
+        subject: Optional[str] = None
+    ) -> str:
         """
         Generate an image using Imagen
         
         Args:
             prompt: Description of the image to generate
+            number_of_images: Variants to request when the image is not cached;
+                              extras are kept in the image cache as alternates
+                              for later, similar prompts
+            photographic: Whether the image is a photo (embedded as JPEG) or a
+                          flat illustration (embedded as a palette PNG)
+            slot: Image placeholder being generated, e.g. HERO_IMAGE
+            subject: The part of the prompt that varies between emails, such
+                     as the campaign or feature text. With a slot, it is
+                     embedded to find a similar cached image for the same
+                     slot; the shared prompt boilerplate is left out so it
+                     cannot make unrelated prompts look alike
             
         Returns:
-            Base64 encoded image data ready for HTML embedding
+            Image URL ready for HTML embedding: a base64 data URL, or a static
+            file URL when images.inline is disabled
         """
         try:
+            # Reuse an image generated for the same or a near-identical prompt
+            embedding = None
+            if self.image_cache:
+                image_bytes = self.image_cache.get(prompt)
+                if image_bytes is None and slot and subject and get_app_setting("image_cache.semantic"):
+                    embedding = self._embed(subject)
+                    if embedding:
+                        image_bytes = self.image_cache.find_similar(embedding, slot)
+                if image_bytes is not None:
+                    return self._to_image_url(image_bytes, photographic)
+            
             response = self.client.models.generate_images(
-                model='imagen-3.0-generate-002',
+                model=get_app_setting("models.image_generation"),
                 prompt=prompt,
-                config=types.GenerateImagesConfig(
-                    number_of_images=1,
-                )
+                config=self._image_config(number_of_images)
             )
+            return self._handle_image_response(prompt, response, embedding, photographic, slot)
             
-            # Get the first generated image
-            image_bytes = response.generated_images[0].image.image_bytes
+        except (errors.APIError, httpx.HTTPError):
+            # Degrade gracefully to a placeholder rather than breaking the email
+            logger.exception("Imagen generation failed")
+            return PLACEHOLDER_IMAGE_URL
+    
+    async def agenerate_image(
+        self,
+        prompt: str,
+        number_of_images: int = 1,
+        photographic: bool = True,
+        slot: Optional[str] = None,
+        subject: Optional[str] = None
+    ) -> str:
+        """
+        Generate an image using Imagen without blocking the event loop
+        
+        Args:
+            prompt: Description of the image to generate
+            number_of_images: Variants to request when the image is not cached;
+                              extras are kept in the image cache as alternates
+                              for later, similar prompts
+            photographic: Whether the image is a photo (embedded as JPEG) or a
+                          flat illustration (embedded as a palette PNG)
+            slot: Image placeholder being generated, e.g. HERO_IMAGE
+            subject: The part of the prompt that varies between emails, such
+                     as the campaign or feature text. With a slot, it is
+                     embedded to find a similar cached image for the same
+                     slot; the shared prompt boilerplate is left out so it
+                     cannot make unrelated prompts look alike
             
-            # Convert to base64 for HTML embedding
-            base64_image = base64.b64encode(image_bytes).decode('utf-8')
-            return f"data:image/png;base64,{base64_image}"
+        Returns:
+            Image URL ready for HTML embedding: a base64 data URL, or a static
+            file URL when images.inline is disabled
+        """
+        return await asyncio.to_thread(
+            self.generate_image, prompt, number_of_images, photographic, slot, subject
+        )
+    
+    def _image_config(self, number_of_images: int) -> types.GenerateImagesConfig:
+        """Build the Imagen request config"""
+        return types.GenerateImagesConfig(
+            # Extra variants are only useful if there is a cache to keep them in
+            number_of_images=number_of_images if self.image_cache else 1,
+        )
+    
+    def _handle_image_response(
+        self,
+        prompt: str,
+        response: types.GenerateImagesResponse,
+        embedding: Optional[List[float]],
+        photographic: bool,
+        slot: Optional[str] = None
+    ) -> str:
+        """
+        Cache the images in an Imagen response and return the first for embedding
+        
+        Args:
+            prompt: The prompt the images were generated from
+            response: The Imagen response
+            embedding: Embedding of the prompt's subject, if one was computed
+            photographic: Whether the image is a photo or a flat illustration
+            slot: Image placeholder the images were generated for
             
-        except Exception as e:
-            # Log the error but use a fallback image to avoid breaking the email
-            error_msg = f"Error generating image: {str(e)}"
-            # We could raise an exception here, but it's better to degrade gracefully
-            # raise AIServiceError(error_msg, f"{self.service_name} Image Generation")
-            # Return a placeholder image URL
-            return "https://via.placeholder.com/500x300"
+        Returns:
+            Image URL ready for HTML embedding: a base64 data URL, or a static
+            file URL when images.inline is disabled
+        """
+        # Imagen returns no images, or images without bytes, when a prompt is
+        # filtered; skip those rather than passing None on
+        usable = [
+            generated.image.image_bytes
+            for generated in response.generated_images or []
+            if generated.image and generated.image.image_bytes
+        ]
+        if not usable:
+            logger.warning("Imagen returned no usable images for prompt")
+            return PLACEHOLDER_IMAGE_URL
+        
+        # Use the first usable image and keep the rest as alternates
+        image_bytes, alternates = usable[0], usable[1:]
+        
+        if self.image_cache:
+            self.image_cache.put(prompt, image_bytes, embedding, alternates, slot)
+        
+        return self._to_image_url(image_bytes, photographic)
+    
+    def _embed(self, prompt: str) -> Optional[List[float]]:
+        """
+        Embed an image prompt for semantic cache lookups
+        
+        Args:
+            prompt: The image prompt
+            
+        Returns:
+            The prompt embedding, or None if it could not be computed
+        """
+        try:
+            response = self.client.models.embed_content(
+                model=get_app_setting("models.embedding"),
+                contents=prompt
+            )
+            return response.embeddings[0].values
+        except Exception:
+            # The cache is an optimization; fall back to generating the image
+            return None
+    
+    @staticmethod
+    def _to_image_url(image_bytes: bytes, photographic: bool = True) -> str:
+        """
+        Shrink image bytes and turn them into a URL for HTML embedding
+        
+        Args:
+            image_bytes: The generated image
+            photographic: Whether the image is a photo or a flat illustration
+            
+        Returns:
+            A base64 data URL, or with images.inline disabled, the URL of a
+            file written to the static directory
+        """
+        image_bytes, mime_type = optimize_image(image_bytes, photographic)
+        
+        if not get_app_setting("images.inline"):
+            # Name files by content so identical images share one URL the
+            # browser can cache across reruns
+            extension = "jpg" if mime_type == "image/jpeg" else "png"
+            file_name = f"{hashlib.sha256(image_bytes).hexdigest()}.{extension}"
+            static_dir = get_app_setting("images.static_dir")
+            try:
+                os.makedirs(static_dir, exist_ok=True)
+                path = os.path.join(static_dir, file_name)
+                if not os.path.exists(path):
+                    with open(path, 'wb') as f:
+                        f.write(image_bytes)
+                return _static_image_url(file_name)
+            except OSError:
+                logger.exception("Could not write image file; embedding it inline")
+        
+        base64_image = base64.b64encode(image_bytes).decode('utf-8')
+        return f"data:{mime_type};base64,{base64_image}"
+
+
+def _static_image_url(file_name: str) -> str:
+    """
+    Build the URL of an image file written to the static directory
+    
+    The URL is root-relative and includes Streamlit's server.baseUrlPath, so
+    it resolves from every page and inside components.html iframes, whatever
+    path the app is served under.
+    
+    Args:
+        file_name: Name of the file in images.static_dir
+        
+    Returns:
+        URL path of the file, e.g. /app/static/generated/<file_name>
+    """
+    # Only needed when images are served as files, so import it here
+    import streamlit as st
+    
+    base_path = (st.get_option("server.baseUrlPath") or "").strip('/')
+    prefix = get_app_setting("images.url_prefix").strip('/')
+    return "/" + "/".join(part for part in (base_path, prefix, file_name) if part)
+
+
+def build_image_prompts(content: Dict) -> Dict[str, str]:
+    """
+    Build the Imagen prompt for each image placeholder
+    
+    Args:
+        content: Dictionary containing email content fields
+        
+    Returns:
+        Dictionary of image placeholders and their prompts
+    """
+    prompts = {}
+    
+    # Hero image based on welcome message and company
+    prompts['HERO_IMAGE'] = f"""
+    Create a professional, minimalist hero banner image for {content['company_name']}.
+    Concept: {content['welcome_message']}
+    
+    STYLE REQUIREMENTS:
+    - Clean, modern aesthetic with subtle color palette
+    - Minimalist composition with plenty of negative space
+    - High-end corporate/professional look
+    - Photorealistic, not illustrated or cartoon-like
+    - Subtle lighting effects and shadows for depth
+    
+    IMPORTANT RESTRICTIONS:
+    - NO TEXT whatsoever in the image
+    - NO logos or explicit branding elements
+    - NO busy patterns or distracting elements
+    - NO people with recognizable faces
+    - Image should be abstract enough to work in any industry
+    """
+    
+    # Feature images based on feature content
+    prompts['FEATURE1_IMAGE'] = f"""
+    Create a professional image representing the concept: {content['feature1_title']}
+    Core idea to convey: {content['feature1_text']}
+    
+    STYLE REQUIREMENTS:
+    - Elegant, minimalist design with a single clear focal point
+    - Soft, professional color palette that complements corporate branding
+    - Clean lines and simple geometry
+    - High-quality photorealistic rendering
+    - Subtle shadows and lighting for dimension
+    
+    IMPORTANT RESTRICTIONS:
+    - NO TEXT or typography elements whatsoever
+    - NO cluttered compositions or busy backgrounds
+    - NO cartoon-style illustrations
+    - NO literal interpretations that look like stock photos
+    - Image should use abstract visual metaphors rather than literal representations
+    """
+    
+    prompts['FEATURE2_IMAGE'] = f"""
+    Create a professional image representing the concept: {content['feature2_title']}
+    Core idea to convey: {content['feature2_text']}
+    
+    STYLE REQUIREMENTS:
+    - Elegant, minimalist design with a single clear focal point
+    - Soft, professional color palette matching the first feature image
+    - Clean lines and simple geometry
+    - High-quality photorealistic rendering
+    - Subtle shadows and lighting for dimension
+    
+    IMPORTANT RESTRICTIONS:
+    - NO TEXT or typography elements whatsoever
+    - NO cluttered compositions or busy backgrounds
+    - NO cartoon-style illustrations
+    - NO literal interpretations that look like stock photos
+    - Image should use abstract visual metaphors rather than literal representations
+    - MUST visually complement the first feature image in style and tone
+    """
+    
+    # Highlight section image
+    prompts['HIGHLIGHT_IMAGE'] = f"""
+    Create a premium, eye-catching image for the key highlight: {content['highlight_title']}
+    Core message to convey: {content['highlight_text']}
+    
+    STYLE REQUIREMENTS:
+    - Bold, sophisticated design with strong visual impact
+    - Rich, premium color palette that stands out while complementing the other images
+    - Elegant composition with a clear focal point
+    - High-end photorealistic rendering with depth and dimension
+    - Professional lighting effects that create visual interest
+    
+    IMPORTANT RESTRICTIONS:
+    - ABSOLUTELY NO TEXT or typography elements
+    - NO generic stock photo look or clichéd business imagery
+    - NO cluttered or busy compositions
+    - NO cartoon-style illustrations
+    - Image should use sophisticated visual metaphors that feel premium and exclusive
+    - Must harmonize with the other images while being slightly more impactful
+    """
+    
+    return prompts
+
+
+def build_image_subjects(content: Dict) -> Dict[str, str]:
+    """
+    Get the part of each build_image_prompts prompt that comes from the content
+    
+    Args:
+        content: Dictionary containing email content fields
+        
+    Returns:
+        Dictionary of image placeholders and their prompt subjects
+    """
+    return {
+        'HERO_IMAGE': f"{content['company_name']}: {content['welcome_message']}",
+        'FEATURE1_IMAGE': f"{content['feature1_title']}: {content['feature1_text']}",
+        'FEATURE2_IMAGE': f"{content['feature2_title']}: {content['feature2_text']}",
+        'HIGHLIGHT_IMAGE': f"{content['highlight_title']}: {content['highlight_text']}",
+    }
+
+
+def build_campaign_image_prompts(template: str, campaign_purpose: str) -> Dict[str, str]:
+    """
+    Build the Imagen prompt for each image placeholder from the campaign alone
+    
+    Unlike build_image_prompts, nothing here depends on a contact's generated
+    content, so one set of images can serve every email in the campaign.
+    
+    Args:
+        template: Name of the template to render
+        campaign_purpose: Description of the campaign purpose
+        
+    Returns:
+        Dictionary of image placeholders and their prompts
+    """
+    email_type = template.rsplit('/', 1)[-1].replace('.html', '').replace('_', ' ')
+    
+    style = """
+    STYLE REQUIREMENTS:
+    - Clean, modern aesthetic with a soft, professional color palette
+    - Minimalist composition with a single clear focal point
+    - High-end photorealistic rendering, not illustrated or cartoon-like
+    - Subtle lighting effects and shadows for depth
+    
+    IMPORTANT RESTRICTIONS:
+    - NO TEXT whatsoever in the image
+    - NO logos or explicit branding elements
+    - NO people with recognizable faces
+    - Image should use abstract visual metaphors rather than literal representations
+    """
+    
+    return {
+        'HERO_IMAGE': f"""
+    Create a professional, minimalist hero banner image for a {email_type} email.
+    Campaign: {campaign_purpose}
+    {style}""",
+        'FEATURE1_IMAGE': f"""
+    Create a professional image representing the main benefit of this campaign: {campaign_purpose}
+    {style}""",
+        'FEATURE2_IMAGE': f"""
+    Create a professional image representing a secondary benefit of this campaign: {campaign_purpose}
+    It must visually complement a companion feature image in style and tone.
+    {style}""",
+        'HIGHLIGHT_IMAGE': f"""
+    Create a premium, eye-catching image for the key highlight of this campaign: {campaign_purpose}
+    It should be slightly more impactful than the other images in the email.
+    {style}""",
+    }
+
+
+def build_campaign_image_subjects(template: str, campaign_purpose: str) -> Dict[str, str]:
+    """
+    Get the part of each build_campaign_image_prompts prompt that varies by campaign
+    
+    Args:
+        template: Name of the template to render
+        campaign_purpose: Description of the campaign purpose
+        
+    Returns:
+        Dictionary of image placeholders and their prompt subjects
+    """
+    email_type = template.rsplit('/', 1)[-1].replace('.html', '').replace('_', ' ')
+    subject = f"{email_type}: {campaign_purpose}"
+    return {name: subject for name in ('HERO_IMAGE', 'FEATURE1_IMAGE', 'FEATURE2_IMAGE', 'HIGHLIGHT_IMAGE')}
@@ -1,22 +1,72 @@
-from typing import Dict, Optional
+from itertools import islice
+from typing import Dict, List, Optional
+import orjson
 import requests
-from ..core.config import get_api_key
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from ..core.config import get_api_key, get_app_setting
 from ..core.exceptions import AIServiceError, ContactDataError
+from .llm_cache import LLMCache
+
+# (connect, read) timeouts for Apollo requests, in seconds
+REQUEST_TIMEOUT = (3, 10)
+
+# Maximum number of records Apollo accepts per bulk match request
+BULK_MATCH_SIZE = 10
 
 class ApolloClient:
     """Client for interacting with the Apollo API"""
     
-    def __init__(self, api_key: Optional[str] = None):
-        """Initialize the Apollo client with an API key"""
+    def __init__(self, api_key: Optional[str] = None, cache: Optional[LLMCache] = None):
+        """
+        Initialize the Apollo client with an API key
+        
+        Args:
+            api_key: Apollo API key; read from the environment if not given
+            cache: Cache for match responses; defaults to the one configured
+                   under apollo_cache, if enabled
+        """
         self.api_key = api_key or get_api_key("APOLLO_API_KEY")
         if not self.api_key:
             raise AIServiceError("API key is required", "Apollo")
         
+        if cache is None and get_app_setting("apollo_cache.enabled"):
+            cache = LLMCache(
+                get_app_setting("apollo_cache.path"),
+                get_app_setting("apollo_cache.ttl_seconds")
+            )
+        self.cache = cache
+        
         self.base_url = "https://api.apollo.io/v1"
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
         }
+        
+        # Reuse connections across requests instead of a new TLS handshake per contact
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        retry = Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=[429, 500, 502, 503, 504],
+            # Match lookups are read-only, so retrying the POST is safe
+            allowed_methods=frozenset({"GET", "POST"})
+        )
+        self.session.mount(
+            "https://",
+            HTTPAdapter(pool_connections=16, pool_maxsize=64, max_retries=retry)
+        )
+    
+    def close(self):
+        """Close the underlying HTTP session"""
+        self.session.close()
+    
+    def __enter__(self) -> "ApolloClient":
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
     
     def enrich_contact(self, contact: Dict) -> Dict:
         """
@@ -29,38 +79,23 @@ class ApolloClient:
         Returns:
             Enriched contact dictionary
         """
+        cached = self._cached_match(contact)
+        if cached is not None:
+            return self._merge_enrichment(contact, cached)
+        
         # Endpoint for enrichment
         endpoint = f"{self.base_url}/people/match"
         
-        # Prepare search criteria
-        search_params = {
-            "email": contact.get("email"),
-            "first_name": contact.get("first_name"),
-            "organization_name": contact.get("company")
-        }
-        
         try:
-            response = requests.post(
+            response = self.session.post(
                 endpoint,
-                headers=self.headers,
-                json=search_params
+                json=self._search_params(contact),
+                timeout=REQUEST_TIMEOUT
             )
             response.raise_for_status()
-            
             data = response.json()
-            if not data.get("person"):
-                return contact
-            
-            # Update contact with enriched data
-            enriched = data["person"]
-            updates = {
-                "job_title": enriched.get("title") or contact.get("job_title", ""),
-                "company": enriched.get("organization", {}).get("name") or contact.get("company", ""),
-                "industry": enriched.get("organization", {}).get("industry") or contact.get("industry", ""),
-                "location": f"{enriched.get('city', '')}, {enriched.get('state', '')}" if enriched.get('city') else contact.get("location", "")
-            }
-            
-            return {**contact, **updates}
+            self._store_match(contact, data)
+            return self._merge_enrichment(contact, data)
             
         except requests.exceptions.RequestException as e:
             # Log the error but don't raise an exception to keep the application running
@@ -68,4 +103,122 @@ class ApolloClient:
             error_msg = f"Error enriching contact {contact.get('email')}: {str(e)}"
             # We could raise an exception here, but it's better to degrade gracefully
             # raise ContactDataError(error_msg)
-            return contact 
\ No newline at end of file
+            return contact
+    
+    def enrich_contacts(self, contacts: List[Dict]) -> List[Dict]:
+        """
+        Enrich several contacts using Apollo's bulk match endpoint
+        
+        Contacts are sent in batches of BULK_MATCH_SIZE. A batch the bulk
+        endpoint rejects is enriched one contact at a time instead.
+        
+        Args:
+            contacts: List of contact dictionaries
+        
+        Returns:
+            Enriched contacts in the same order; any contact that could not be
+            enriched is returned unchanged
+        """
+        enriched: List[Optional[Dict]] = []
+        misses = []
+        for index, contact in enumerate(contacts):
+            cached = self._cached_match(contact)
+            if cached is None:
+                enriched.append(None)
+                misses.append(index)
+            else:
+                enriched.append(self._merge_enrichment(contact, cached))
+        
+        # Only contacts missing from the cache are sent to Apollo
+        remaining = iter(misses)
+        while True:
+            batch = list(islice(remaining, BULK_MATCH_SIZE))
+            if not batch:
+                return enriched
+            results = self._enrich_batch([contacts[index] for index in batch])
+            for index, result in zip(batch, results):
+                enriched[index] = result
+    
+    def _enrich_batch(self, batch: List[Dict]) -> List[Dict]:
+        """Enrich one bulk match batch, falling back to single matches on failure"""
+        try:
+            response = self.session.post(
+                f"{self.base_url}/people/bulk_match",
+                json={"details": [self._search_params(contact) for contact in batch]},
+                timeout=REQUEST_TIMEOUT
+            )
+            response.raise_for_status()
+            matches = response.json().get("matches") or []
+        except (requests.exceptions.RequestException, ValueError):
+            return [self.enrich_contact(contact) for contact in batch]
+        
+        if len(matches) != len(batch):
+            # Cannot line matches up with contacts
+            return [self.enrich_contact(contact) for contact in batch]
+        
+        enriched = []
+        for contact, match in zip(batch, matches):
+            data = {"person": match}
+            self._store_match(contact, data)
+            enriched.append(self._merge_enrichment(contact, data))
+        return enriched
+    
+    def _cache_key(self, contact: Dict) -> Optional[str]:
+        """Cache key identifying a contact, or None if it cannot be identified"""
+        if contact.get("email"):
+            return LLMCache.make_key(contact["email"])
+        if contact.get("first_name") or contact.get("company"):
+            return LLMCache.make_key(f"{contact.get('first_name', '')}|{contact.get('company', '')}")
+        return None
+    
+    def _cached_match(self, contact: Dict) -> Optional[Dict]:
+        """Return the cached match response for a contact, if any"""
+        key = self._cache_key(contact) if self.cache else None
+        cached = self.cache.get(key) if key else None
+        if cached is None:
+            return None
+        try:
+            return orjson.loads(cached)
+        except orjson.JSONDecodeError:
+            return None
+    
+    def _store_match(self, contact: Dict, data: Dict) -> None:
+        """Cache a match response for a contact"""
+        key = self._cache_key(contact) if self.cache else None
+        if key:
+            self.cache.set(key, orjson.dumps(data).decode())
+    
+    @staticmethod
+    def _search_params(contact: Dict) -> Dict:
+        """Build the match criteria for a contact"""
+        return {
+            "email": contact.get("email"),
+            "first_name": contact.get("first_name"),
+            "organization_name": contact.get("company")
+        }
+    
+    @staticmethod
+    def _merge_enrichment(contact: Dict, data: Dict) -> Dict:
+        """
+        Merge an Apollo match response into a contact
+        
+        Args:
+            contact: The original contact
+            data: Decoded match response
+        
+        Returns:
+            The contact updated with the matched person's details
+        """
+        if not data.get("person"):
+            return contact
+        
+        # Update contact with enriched data
+        enriched = data["person"]
+        updates = {
+            "job_title": enriched.get("title") or contact.get("job_title", ""),
+            "company": enriched.get("organization", {}).get("name") or contact.get("company", ""),
+            "industry": enriched.get("organization", {}).get("industry") or contact.get("industry", ""),
+            "location": f"{enriched.get('city', '')}, {enriched.get('state', '')}" if enriched.get('city') else contact.get("location", "")
+        }
+        
+        return {**contact, **updates}
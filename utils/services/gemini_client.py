@@ -0,0 +1,36 @@
+"""
+Gemini client sharing for the Email Creation application.
+
+This module keeps one Gemini client per API key for the whole process, so
+its HTTP connection pool and auth state are set up once rather than by
+every service, agent and campaign thread that talks to Gemini.
+
+The shared clients are for synchronous calls only. A client's async pool
+(client.aio) stays bound to the first event loop that uses it, and the app
+runs each prompt on a new loop, so async callers must run the synchronous
+methods on a worker thread instead.
+"""
+import threading
+from typing import Dict
+from google import genai
+
+_CLIENTS: Dict[str, genai.Client] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+def get_gemini_client(api_key: str) -> genai.Client:
+    """
+    Get the shared Gemini client for an API key, creating it on first use
+    
+    Only call its synchronous methods; do not use client.aio.
+    
+    Args:
+        api_key: Gemini API key
+        
+    Returns:
+        The process-wide client for the key
+    """
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(api_key)
+        if client is None:
+            client = _CLIENTS[api_key] = genai.Client(api_key=api_key)
+        return client
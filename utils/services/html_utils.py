@@ -1,15 +1,27 @@
+import logging
 import os
+import re
 from typing import Dict, Optional
-from google import genai
-from google.genai import types
-from PIL import Image
-from io import BytesIO
+import httpx
+from google.genai import errors, types
 import base64
 from bs4 import BeautifulSoup
 from jinja2 import Environment, FileSystemLoader
 from datetime import datetime
 from ..core.config import get_api_key
 from ..core.exceptions import AIServiceError, TemplateNotFoundError, EmailCompilationError
+from .gemini_client import get_gemini_client
+from .image_processing import PLACEHOLDER_IMAGE_URL
+
+logger = logging.getLogger(__name__)
+
+# Placeholder comments that inject_content fills in, e.g. <!-- HEADLINE -->
+_PLACEHOLDER_RE = re.compile(
+    r"<!--\s*(SUBJECT|HEADLINE|BODY|CTA_TEXT|CTA_LINK|UNSUBSCRIBE_LINK|HEADER_IMAGE)\s*-->"
+)
+
+# Detects a <title> tag in any letter case without lowercasing the template
+_TITLE_TAG_RE = re.compile(r"<title", re.IGNORECASE)
 
 class HTMLProcessor:
     """Process HTML templates with content and generated images"""
@@ -20,7 +32,7 @@ class HTMLProcessor:
         if not api_key:
             raise AIServiceError("API key is required for image generation", "Gemini")
         
-        self.client = genai.Client(api_key=api_key)
+        self.client = get_gemini_client(api_key)
     
     def generate_image(self, prompt: str) -> str:
         """
@@ -41,6 +53,11 @@ class HTMLProcessor:
                 )
             )
             
+            if not response.generated_images:
+                # Imagen returns no images when a prompt is filtered
+                logger.warning("Imagen returned no images for prompt")
+                return PLACEHOLDER_IMAGE_URL
+            
             # Get the first generated image
             image_bytes = response.generated_images[0].image.image_bytes
             
@@ -48,13 +65,10 @@ class HTMLProcessor:
             base64_image = base64.b64encode(image_bytes).decode('utf-8')
             return f"data:image/png;base64,{base64_image}"
             
-        except Exception as e:
-            # Log the error but use a fallback image to avoid breaking the email
-            error_msg = f"Error generating image: {str(e)}"
-            # We could raise an exception here, but it's better to degrade gracefully
-            # raise AIServiceError(error_msg, "Gemini Image Generation")
-            # Return a placeholder image URL
-            return "https://via.placeholder.com/500x300"
+        except (errors.APIError, httpx.HTTPError):
+            # Degrade gracefully to a placeholder rather than breaking the email
+            logger.exception("Imagen generation failed")
+            return PLACEHOLDER_IMAGE_URL
     
     def generate_email_images(self, content: Dict[str, str]) -> Dict[str, str]:
         """
@@ -213,6 +227,10 @@ class HTMLProcessor:
         Returns:
             Processed HTML with content injected
         """
+        # Only templates with a <title> need a DOM parse; skip lxml otherwise
+        if not _TITLE_TAG_RE.search(template):
+            return HTMLProcessor._replace_placeholders(template, content)
+        
         soup = BeautifulSoup(template, 'lxml')
         
         # Replace title/subject
@@ -220,22 +238,32 @@ class HTMLProcessor:
         if title_tag:
             title_tag.string = content.get('subject', '')
         
-        # Replace content in HTML comments
-        html = str(soup)
+        return HTMLProcessor._replace_placeholders(str(soup), content)
+    
+    @staticmethod
+    def _replace_placeholders(html: str, content: Dict[str, str]) -> str:
+        """
+        Replace the placeholder comments in HTML with content
+        
+        Args:
+            html: HTML string containing placeholder comments
+            content: Dictionary containing content to inject
+            
+        Returns:
+            HTML with placeholders replaced
+        """
         replacements = {
-            '<!-- SUBJECT -->': content.get('subject', ''),
-            '<!-- HEADLINE -->': content.get('headline', ''),
-            '<!-- BODY -->': content.get('body', ''),
-            '<!-- CTA_TEXT -->': content.get('cta_text', ''),
-            '<!-- CTA_LINK -->': '#', # Default link
-            '<!-- UNSUBSCRIBE_LINK -->': '#', # Default unsubscribe
-            '<!-- HEADER_IMAGE -->': '', # No image by default
+            'SUBJECT': content.get('subject', ''),
+            'HEADLINE': content.get('headline', ''),
+            'BODY': content.get('body', ''),
+            'CTA_TEXT': content.get('cta_text', ''),
+            'CTA_LINK': '#', # Default link
+            'UNSUBSCRIBE_LINK': '#', # Default unsubscribe
+            'HEADER_IMAGE': '', # No image by default
         }
         
-        for old, new in replacements.items():
-            html = html.replace(old, new)
-        
-        return html
+        # Single pass over the document instead of one str.replace per placeholder
+        return _PLACEHOLDER_RE.sub(lambda match: replacements[match.group(1)], html)
     
     @staticmethod
     def get_available_templates(templates_dir: str) -> list:
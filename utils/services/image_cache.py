@@ -0,0 +1,193 @@
+"""
+Image Cache for the Email Creation application.
+
+This module provides a disk-backed cache for generated images. Prompts are
+matched by exact hash first and then by embedding similarity, so that
+near-duplicate prompts can reuse a previously generated image. Similarity
+lookups only compare images generated for the same slot (e.g. HERO_IMAGE).
+"""
+import hashlib
+import math
+import os
+import threading
+from typing import Dict, List, Optional, Sequence
+import orjson
+
+class ImageCache:
+    """Disk cache of generated images keyed by prompt"""
+
+    def __init__(self, directory: str, similarity_threshold: float = 0.97):
+        """
+        Initialize the image cache
+
+        Args:
+            directory: Directory holding the cached images and their index
+            similarity_threshold: Minimum cosine similarity for a semantic hit
+        """
+        self.directory = directory
+        self.similarity_threshold = similarity_threshold
+        self._index_path = os.path.join(directory, "index.json")
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = self._load_index()
+        # Next variant to serve for each key with alternates
+        self._rotation: Dict[str, int] = {}
+
+    @staticmethod
+    def make_key(prompt: str) -> str:
+        """Return the stable cache key for a prompt"""
+        return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+    def get(self, prompt: str) -> Optional[bytes]:
+        """
+        Look up an image generated for exactly this prompt
+
+        Args:
+            prompt: The image prompt
+
+        Returns:
+            The cached image bytes, or None on a miss
+        """
+        entry = self._entries.get(self.make_key(prompt))
+        return self._read(entry) if entry else None
+
+    def find_similar(self, embedding: List[float], slot: str) -> Optional[bytes]:
+        """
+        Look up an image generated for a prompt with a similar embedding
+
+        Args:
+            embedding: Embedding of the variable part of the prompt being
+                       generated, such as the campaign or feature text
+            slot: Image slot being generated; only images stored for the
+                  same slot are compared
+
+        Returns:
+            The cached image bytes of the closest prompt above the
+            similarity threshold, or None if there is none. When the match
+            has alternate variants they are served in rotation, so similar
+            campaigns do not all get the identical image.
+        """
+        norm = _norm(embedding)
+        if not norm:
+            return None
+
+        best_key, best_score = None, self.similarity_threshold
+        for key, entry in list(self._entries.items()):
+            other = entry.get('embedding')
+            if entry.get('slot') != slot or not other or not entry.get('norm'):
+                continue
+            score = sum(a * b for a, b in zip(embedding, other)) / (norm * entry['norm'])
+            if score >= best_score:
+                best_key, best_score = key, score
+
+        if best_key is None:
+            return None
+        return self._read(self._entries[best_key], self._next_variant(best_key))
+
+    def put(
+        self,
+        prompt: str,
+        image_bytes: bytes,
+        embedding: Optional[List[float]] = None,
+        alternates: Sequence[bytes] = (),
+        slot: Optional[str] = None
+    ) -> None:
+        """
+        Store a generated image
+
+        Args:
+            prompt: The prompt the image was generated from
+            image_bytes: The generated image
+            embedding: Optional embedding for semantic lookups, as passed to
+                       find_similar
+            alternates: Extra variants generated for the same prompt, stored
+                        under sibling keys ({key}-alt1, {key}-alt2, ...)
+            slot: Image slot the image was generated for; required for the
+                  image to be found by find_similar
+        """
+        key = self.make_key(prompt)
+        entry = {
+            'file': f"{key}.png",
+            'alternates': [f"{key}-alt{i}.png" for i in range(1, len(alternates) + 1)],
+        }
+        if embedding and slot:
+            entry['slot'] = slot
+            entry['embedding'] = list(embedding)
+            entry['norm'] = _norm(embedding)
+
+        with self._lock:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                files = [entry['file'], *entry['alternates']]
+                for file_name, data in zip(files, [image_bytes, *alternates]):
+                    with open(os.path.join(self.directory, file_name), 'wb') as f:
+                        f.write(data)
+                self._entries[key] = entry
+                self._write_index()
+            except OSError:
+                # Caching is best effort; a read-only disk must not fail generation
+                self._entries.pop(key, None)
+
+    def _next_variant(self, key: str) -> int:
+        """
+        Return the variant to serve for a semantic hit and advance the rotation
+
+        The rotation is kept in memory only, so a cache hit never rewrites the
+        index; after a restart it simply starts over.
+        """
+        with self._lock:
+            variants = len(self._entries[key].get('alternates', [])) + 1
+            # Start with an alternate: the original prompt already got the primary
+            variant = self._rotation.get(key, 1) % variants
+            self._rotation[key] = (variant + 1) % variants
+            return variant
+
+    def _read(self, entry: Dict, variant: int = 0) -> Optional[bytes]:
+        """Read an image file for an index entry; variant 0 is the primary image"""
+        files = [entry['file'], *entry.get('alternates', [])]
+        try:
+            with open(os.path.join(self.directory, files[variant % len(files)]), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _load_index(self) -> Dict[str, Dict]:
+        """Load the index from disk, starting empty if it is missing or corrupt"""
+        try:
+            with open(self._index_path, 'rb') as f:
+                return orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            return {}
+
+    def _write_index(self) -> None:
+        """Atomically write the index to disk"""
+        tmp_path = f"{self._index_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(self._entries))
+        os.replace(tmp_path, self._index_path)
+
+
+def _norm(vector: List[float]) -> float:
+    """Euclidean norm of a vector"""
+    return math.sqrt(sum(x * x for x in vector))
+
+
+# One cache per directory, shared by every service instance in the process
+_CACHES: Dict[str, ImageCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+def get_image_cache(directory: str, similarity_threshold: float = 0.97) -> ImageCache:
+    """
+    Get the shared image cache for a directory
+
+    Args:
+        directory: Directory holding the cached images
+        similarity_threshold: Minimum cosine similarity for a semantic hit
+
+    Returns:
+        The image cache for the directory
+    """
+    with _CACHES_LOCK:
+        cache = _CACHES.get(directory)
+        if cache is None:
+            cache = _CACHES[directory] = ImageCache(directory, similarity_threshold)
+        return cache
@@ -0,0 +1,51 @@
+"""
+Image processing for the Email Creation application.
+
+This module shrinks generated images before they are embedded in emails.
+Imagen returns full-resolution PNGs of around 1MB each, far more than an
+email needs.
+"""
+from io import BytesIO
+from typing import Tuple
+
+# Returned instead of an image when generation fails, so the email still renders
+PLACEHOLDER_IMAGE_URL = "https://via.placeholder.com/500x300"
+
+# Longest edge, in pixels, of an image embedded in an email
+MAX_EDGE = 1024
+
+# JPEG quality for photographic images
+JPEG_QUALITY = 85
+
+def optimize_image(image_bytes: bytes, photographic: bool = True) -> Tuple[bytes, str]:
+    """
+    Downscale and re-encode an image for embedding in an email
+
+    Args:
+        image_bytes: The original image
+        photographic: Encode as JPEG when True; as an 8-bit palette PNG for
+                      flat illustrations when False
+
+    Returns:
+        Tuple of the optimized image bytes and their MIME type
+    """
+    # Pillow is only needed here, so keep it off the app's import path
+    from PIL import Image
+
+    try:
+        image = Image.open(BytesIO(image_bytes))
+        image.load()
+    except OSError:
+        # Not an image Pillow understands; embed it unchanged
+        return image_bytes, "image/png"
+
+    if max(image.size) > MAX_EDGE:
+        image.thumbnail((MAX_EDGE, MAX_EDGE), Image.Resampling.LANCZOS)
+
+    buffer = BytesIO()
+    if photographic:
+        image.convert("RGB").save(buffer, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+        return buffer.getvalue(), "image/jpeg"
+
+    image.convert("RGB").quantize(colors=256).save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue(), "image/png"
@@ -0,0 +1,122 @@
+"""
+LLM Cache for the Email Creation application.
+
+This module provides a persistent, SQLite-backed cache for API responses,
+so repeated identical requests are answered locally instead of by the API.
+It backs both the Gemini text responses and the Apollo enrichment results.
+"""
+import hashlib
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+class LLMCache:
+    """Persistent key-value cache for model responses"""
+
+    def __init__(self, path: str, ttl_seconds: Optional[float] = None):
+        """
+        Initialize the cache, creating the database if needed
+
+        Args:
+            path: Path to the SQLite database file
+            ttl_seconds: Age after which entries are ignored; None keeps them forever
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS cache "
+                    "(key TEXT PRIMARY KEY, value BLOB, ts REAL)"
+                )
+        except (OSError, sqlite3.Error):
+            # Without a database every lookup is simply a miss
+            pass
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """
+        Build a cache key from the parts that determine a response
+
+        Args:
+            parts: e.g. the model name and the prompt
+
+        Returns:
+            SHA-256 hex digest of the parts
+        """
+        return hashlib.sha256("\0".join(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached value
+
+        Args:
+            key: Cache key
+
+        Returns:
+            The cached value, or None if it is missing or expired
+        """
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT value, ts FROM cache WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+
+        if row is None:
+            return None
+        value, ts = row
+        if self.ttl_seconds is not None and time.time() - ts > self.ttl_seconds:
+            return None
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    def set(self, key: str, value: str) -> None:
+        """
+        Store a value
+
+        Args:
+            key: Cache key
+            value: Value to store
+        """
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, ts) VALUES (?, ?, ?)",
+                    (key, value.encode('utf-8'), time.time())
+                )
+        except sqlite3.Error:
+            # Caching is best effort
+            pass
+
+    def get_or_set(self, key: str, fetch: Callable[[], str]) -> str:
+        """
+        Return the cached value for a key, fetching and storing it on a miss
+
+        Args:
+            key: Cache key
+            fetch: Called to produce the value on a miss
+
+        Returns:
+            The cached or freshly fetched value
+        """
+        value = self.get(key)
+        if value is None:
+            value = fetch()
+            self.set(key, value)
+        return value
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection for one operation, which keeps the cache thread-safe"""
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
@@ -5,12 +5,61 @@ This module provides functionality for managing email templates,
 including discovery, validation, and metadata extraction.
 """
 import os
-from typing import Dict, List, Optional
-from jinja2 import Environment, FileSystemLoader
-from bs4 import BeautifulSoup
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from jinja2 import TemplateError as JinjaTemplateError
+from jinja2 import meta
+import orjson
+from lxml import html
 from datetime import datetime
+from functools import lru_cache
+from ..core.config import get_app_setting
 from ..core.exceptions import TemplateNotFoundError, TemplateError
 
+# Template variables taken from the content, with their defaults
+_DEFAULTS = {
+    # Email metadata
+    'subject': '',
+    'preheader': '',
+    
+    # Main content
+    'headline': '',
+    'subheadline': '',
+    'welcome_message': '',
+    
+    # Company info
+    'company_name': '',
+    'company_address': '',
+    'logo_url': '',
+    
+    # Features
+    'feature1_title': '',
+    'feature1_text': '',
+    'feature2_title': '',
+    'feature2_text': '',
+    
+    # Highlight section
+    'highlight_title': '',
+    'highlight_text': '',
+    
+    # CTA section
+    'cta_headline': '',
+    'cta_text': '',
+    'cta_url': '#',
+    
+    # Footer links
+    'privacy_link': '#',
+    'terms_link': '#',
+    'unsubscribe_link': '#',
+}
+
+@lru_cache(maxsize=1)
+def _current_year() -> int:
+    """The year for the footer, looked up once per process"""
+    return datetime.now().year
+
 class TemplateService:
     """Service for managing email templates"""
     
@@ -22,36 +71,111 @@ class TemplateService:
             templates_dir: Path to the templates directory
         """
         self.templates_dir = templates_dir
-        # Use a FileSystemLoader that includes both the templates directory and all subdirectories
-        self.env = Environment(loader=FileSystemLoader([templates_dir, 
-                                                       os.path.join(templates_dir, "welcome"),
-                                                       os.path.join(templates_dir, "announcements"),
-                                                       os.path.join(templates_dir, "newsletters")]))
+        # Search the templates directory and each of its subdirectories, so a
+        # template resolves both by its relative path and by its bare name
+        self.env = Environment(
+            loader=FileSystemLoader([templates_dir], followlinks=False),
+            auto_reload=get_app_setting("templates.auto_reload"),
+            cache_size=400,
+            bytecode_cache=self._create_bytecode_cache()
+        )
+        # (directory signature, template names) from the last scan
+        self._templates_cache: Optional[Tuple[Tuple[int, ...], List[str]]] = None
+        # Subdirectories found by the last scan, whose mtimes make up the signature
+        self._subdirs: List[str] = []
+        
+        # Metadata derived from each template file, by path, stored with the
+        # mtime_ns and size of the file it was extracted from
+        self._meta_cache_path = get_app_setting("templates.metadata_cache_path")
+        self._meta_cache: Dict[str, Dict] = self._load_meta_cache()
+        self._meta_lock = threading.Lock()
+        self._meta_dirty = False
+        
+        # Compile every template up front so the first render is already hot
+        templates = self.get_available_templates()
+        for template_name in templates:
+            try:
+                self.env.get_template(template_name)
+            except JinjaTemplateError:
+                # Reported when the template is actually rendered
+                pass
+        
+        # Extract any metadata missing from the cache
+        with ThreadPoolExecutor() as executor:
+            list(executor.map(self._warm_metadata, templates))
+        self.flush()
         
+    @staticmethod
+    def _create_bytecode_cache() -> Optional[FileSystemBytecodeCache]:
+        """Create the on-disk bytecode cache, or None if its directory cannot be created"""
+        directory = get_app_setting("templates.bytecode_cache_dir")
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError:
+            return None
+        return FileSystemBytecodeCache(directory=directory)
+    
     def get_available_templates(self) -> List[str]:
         """
         Get list of available template names in the templates directory
         
+        The directory is only rescanned when it or one of its subdirectories
+        has been modified since the last call.
+        
         Returns:
             List of template names (without .html extension)
         """
-        if not os.path.exists(self.templates_dir):
+        signature = self._directory_signature()
+        if signature is None:
             return []
-            
-        templates = []
-        for file in os.listdir(self.templates_dir):
-            if file.endswith('.html'):
-                templates.append(file)
         
-        # Also check subdirectories
-        for subdir in os.listdir(self.templates_dir):
-            subdir_path = os.path.join(self.templates_dir, subdir)
-            if os.path.isdir(subdir_path):
-                for file in os.listdir(subdir_path):
-                    if file.endswith('.html'):
-                        templates.append(f"{subdir}/{file}")
+        if self._templates_cache is None or self._templates_cache[0] != signature:
+            templates, self._subdirs = self._scan_templates()
+            self.env.loader.searchpath = self._search_paths()
+            # Rescanning may have found new subdirectories
+            self._templates_cache = (self._directory_signature(), templates)
         
-        return templates
+        return list(self._templates_cache[1])
+    
+    def _search_paths(self) -> List[str]:
+        """The templates directory followed by the subdirectories found by the last scan"""
+        return [self.templates_dir] + [
+            os.path.join(self.templates_dir, subdir) for subdir in self._subdirs
+        ]
+    
+    def _directory_signature(self) -> Optional[Tuple[int, ...]]:
+        """Modification times of the templates directory and its known subdirectories"""
+        try:
+            signature = [os.stat(self.templates_dir).st_mtime_ns]
+        except OSError:
+            return None
+        for subdir in self._subdirs:
+            try:
+                signature.append(os.stat(os.path.join(self.templates_dir, subdir)).st_mtime_ns)
+            except OSError:
+                # A subdirectory disappeared; force a rescan
+                signature.append(-1)
+        return tuple(signature)
+    
+    def _scan_templates(self) -> Tuple[List[str], List[str]]:
+        """
+        Find the templates in the templates directory and its subdirectories
+        
+        Returns:
+            Tuple of the template names and the subdirectory names
+        """
+        templates, subdirs = [], []
+        with os.scandir(self.templates_dir) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                    with os.scandir(entry.path) as sub_entries:
+                        for sub_entry in sub_entries:
+                            if sub_entry.name.endswith('.html') and sub_entry.is_file():
+                                templates.append(f"{entry.name}/{sub_entry.name}")
+                elif entry.name.endswith('.html'):
+                    templates.append(entry.name)
+        return sorted(templates), subdirs
     
     def get_template_metadata(self, template_name: str) -> Dict:
         """
@@ -66,24 +190,94 @@ class TemplateService:
         template_path = self._get_template_path(template_name)
         
         try:
-            with open(template_path, 'r') as f:
-                content = f.read()
-                
-            soup = BeautifulSoup(content, 'lxml')
-            
-            # Extract metadata from HTML comments or meta tags
-            metadata = {
-                'name': template_name,
-                'title': soup.title.string if soup.title else template_name,
-                'description': self._extract_meta_description(soup),
-                'category': self._determine_category(template_name),
-                'required_fields': self._extract_required_fields(content),
-            }
-            
-            return metadata
-            
+            file_metadata = self._file_metadata(template_path)
+            self.flush()
         except Exception as e:
             raise TemplateError(f"Error extracting metadata from template {template_name}: {str(e)}")
+        
+        # The name is the one the caller used, which may be bare or a relative path
+        return {
+            'name': template_name,
+            'title': file_metadata['title'] or template_name,
+            'description': file_metadata['description'],
+            'category': file_metadata['category'],
+            'required_fields': list(file_metadata['required_fields']),
+        }
+    
+    def _file_metadata(self, template_path: str) -> Dict:
+        """
+        Get the metadata that depends only on a template file, from the cache
+        when the file is unchanged
+        
+        Args:
+            template_path: Full path to the template
+            
+        Returns:
+            Dictionary with the title, description, category and required fields
+        """
+        stat = os.stat(template_path)
+        cached = self._meta_cache.get(template_path)
+        if cached and cached['mtime_ns'] == stat.st_mtime_ns and cached['size'] == stat.st_size:
+            return cached['metadata']
+        
+        with open(template_path, 'r') as f:
+            content = f.read()
+            
+        # The title and description live in <head>; skip parsing the body
+        head_end = content.find('</head>')
+        tree = html.fromstring(content[:head_end + len('</head>')] if head_end != -1 else content)
+        
+        # Extract metadata from HTML comments or meta tags
+        metadata = {
+            'title': tree.findtext('.//title') or '',
+            'description': self._extract_meta_description(tree),
+            'category': self._determine_category(template_path),
+            'required_fields': self._extract_required_fields(content),
+        }
+        
+        with self._meta_lock:
+            self._meta_cache[template_path] = {
+                'mtime_ns': stat.st_mtime_ns,
+                'size': stat.st_size,
+                'metadata': metadata,
+            }
+            self._meta_dirty = True
+        
+        return metadata
+    
+    def flush(self) -> None:
+        """Write the metadata cache to disk if it has changed"""
+        with self._meta_lock:
+            if not self._meta_dirty:
+                return
+            try:
+                directory = os.path.dirname(self._meta_cache_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                tmp_path = f"{self._meta_cache_path}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(orjson.dumps(self._meta_cache))
+                os.replace(tmp_path, self._meta_cache_path)
+                self._meta_dirty = False
+            except OSError:
+                # The cache is rebuilt from the templates next time
+                pass
+    
+    def _load_meta_cache(self) -> Dict[str, Dict]:
+        """Load the metadata cache from disk, starting empty if it is missing or corrupt"""
+        try:
+            with open(self._meta_cache_path, 'rb') as f:
+                return orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            return {}
+    
+    def _warm_metadata(self, template_name: str) -> None:
+        """Populate the metadata cache for a template, ignoring templates that fail"""
+        try:
+            self._file_metadata(self._get_template_path(template_name))
+        except Exception:
+            # Reported when the metadata is actually requested
+            pass
     
     def render_template(self, template_name: str, content: Dict) -> str:
         """
@@ -101,45 +295,9 @@ class TemplateService:
             template = self.env.get_template(template_name)
             
             # Prepare template variables
-            template_vars = {
-                # Email metadata
-                'subject': content.get('subject', ''),
-                'preheader': content.get('preheader', ''),
-                
-                # Main content
-                'headline': content.get('headline', ''),
-                'subheadline': content.get('subheadline', ''),
-                'welcome_message': content.get('welcome_message', ''),
-                
-                # Company info
-                'company_name': content.get('company_name', ''),
-                'company_address': content.get('company_address', ''),
-                'logo_url': content.get('logo_url', ''),
-                
-                # Features
-                'feature1_title': content.get('feature1_title', ''),
-                'feature1_text': content.get('feature1_text', ''),
-                'feature2_title': content.get('feature2_title', ''),
-                'feature2_text': content.get('feature2_text', ''),
-                
-                # Highlight section
-                'highlight_title': content.get('highlight_title', ''),
-                'highlight_text': content.get('highlight_text', ''),
-                
-                # CTA section
-                'cta_headline': content.get('cta_headline', ''),
-                'cta_text': content.get('cta_text', ''),
-                'cta_button': bool(content.get('cta_text')),
-                'cta_url': content.get('cta_url', '#'),
-                
-                # Footer links
-                'privacy_link': content.get('privacy_link', '#'),
-                'terms_link': content.get('terms_link', '#'),
-                'unsubscribe_link': content.get('unsubscribe_link', '#'),
-                
-                # Metadata
-                'year': datetime.now().year,
-            }
+            template_vars = {key: content.get(key, default) for key, default in _DEFAULTS.items()}
+            template_vars['cta_button'] = bool(content.get('cta_text'))
+            template_vars['year'] = _current_year()
             
             # Add images if they exist in content
             for key, value in content.items():
@@ -162,40 +320,50 @@ class TemplateService:
         Returns:
             Full path to the template
         """
-        # Check if template includes a subdirectory
-        if '/' in template_name:
-            template_path = os.path.join(self.templates_dir, template_name)
-        else:
-            template_path = os.path.join(self.templates_dir, template_name)
-            
-        if not os.path.exists(template_path):
-            raise TemplateNotFoundError(f"Template not found: {template_path}")
+        # Resolve the name the same way the loader does, so bare names such
+        # as welcome_email.html are found in their subdirectory
+        for directory in self._search_paths():
+            template_path = os.path.join(directory, template_name)
+            if os.path.exists(template_path):
+                return template_path
             
-        return template_path
+        raise TemplateNotFoundError(f"Template not found: {template_name}")
     
-    def _extract_meta_description(self, soup: BeautifulSoup) -> str:
+    def _extract_meta_description(self, tree: html.HtmlElement) -> str:
         """Extract description from meta tags"""
-        meta = soup.find('meta', attrs={'name': 'description'})
-        if meta and meta.get('content'):
-            return meta.get('content')
-        return ""
-    
-    def _determine_category(self, template_name: str) -> str:
-        """Determine template category from its path"""
-        if '/' in template_name:
-            return template_name.split('/')[0]
+        return tree.xpath('string(//meta[@name="description"]/@content)')
+    
+    def _determine_category(self, template_path: str) -> str:
+        """Determine template category from the subdirectory the template is in"""
+        directory = os.path.relpath(os.path.dirname(template_path), self.templates_dir)
+        if directory != os.curdir:
+            return directory.split(os.sep)[0]
         return "general"
     
     def _extract_required_fields(self, content: str) -> List[str]:
         """Extract required fields from template content"""
-        required_fields = []
-        
-        # Simple extraction based on Jinja2 variables
-        # This is a basic implementation and could be improved
-        import re
-        matches = re.findall(r'\{\{\s*(\w+)\s*\}\}', content)
-        for match in matches:
-            if match not in required_fields and not match.startswith('_'):
-                required_fields.append(match)
-                
-        return required_fields
+        # Every variable the template reads without defining it itself
+        variables = meta.find_undeclared_variables(self.env.parse(content))
+        return sorted(name for name in variables if not name.startswith('_'))
+
+
+# One service per templates directory, shared by every agent and service in
+# the process, so the templates are compiled and their metadata warmed once
+_SERVICES: Dict[str, TemplateService] = {}
+_SERVICES_LOCK = threading.Lock()
+
+def get_template_service(templates_dir: str = "templates") -> TemplateService:
+    """
+    Get the shared template service for a templates directory
+    
+    Args:
+        templates_dir: Path to the templates directory
+        
+    Returns:
+        The template service for the directory
+    """
+    with _SERVICES_LOCK:
+        service = _SERVICES.get(templates_dir)
+        if service is None:
+            service = _SERVICES[templates_dir] = TemplateService(templates_dir)
+        return service
@@ -5,9 +5,11 @@ This module provides UI components for rendering the assistant selection dropdow
 and managing the active assistant's UI.
 """
 import streamlit as st
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
 from ..assistants.registry import registry
+from ..core.state import get_campaign_progress
+from .page_utils import render_email_preview
 
 def render_assistant_selector() -> None:
     """
@@ -24,16 +26,7 @@ def render_assistant_selector() -> None:
     current_assistant = registry.get_current_assistant()
     current_index = assistant_options.index(current_assistant.display_name)
     
-    # Add a dropdown to select the assistant with custom styling
-    st.sidebar.markdown("""
-    <style>
-    div[data-testid="stSelectbox"] > div > div > div {
-        font-weight: bold;
-        font-size: 1.1em;
-    }
-    </style>
-    """, unsafe_allow_html=True)
-    
+    # Add a dropdown to select the assistant; its styling comes from setup_page
     selected_index = st.sidebar.selectbox(
         "Select an assistant:",
         range(len(assistant_options)),
@@ -74,24 +67,123 @@ def render_assistant_ui() -> None:
     # Display chat messages
     render_chat_messages()
     
+    # Show the progress of a campaign running in the background
+    if st.session_state.get('campaign', {}).get('running'):
+        render_progress()
+    
     # Show example prompts and get the selected one if any
     example_prompt = assistant.render_example_prompts()
     
     return example_prompt
 
+@st.fragment
 def render_chat_messages() -> None:
-    """Render all chat messages with their HTML content if available."""
+    """
+    Render all chat messages with their HTML content if available.
+    
+    Only the latest email is previewed in an iframe. Each iframe re-ships its
+    whole HTML to the browser on every rerun, so earlier emails are collapsed
+    and only rendered when the user asks for them.
+    
+    Runs as a fragment, so the preview toggles and download buttons rerun
+    just the chat history instead of the whole app.
+    """
     # We're still using the shared messages state for now to maintain compatibility
     # In the future, each assistant could have its own message history
     if 'messages' in st.session_state and st.session_state.messages:
-        for message in st.session_state.messages:
-            with st.chat_message(message["role"]):
-                st.markdown(message["content"])
-                if "html" in message:
-                    st.components.v1.html(message["html"], height=800, scrolling=True)
-                    st.download_button(
-                        "Download HTML",
-                        message["html"],
-                        file_name="email_preview.html",
-                        mime="text/html"
-                    )
+        messages = st.session_state.messages
+        latest_html_index = max(
+            (i for i, message in enumerate(messages) if "html" in message),
+            default=None
+        )
+        
+        for role, text, i in _group_messages(messages):
+            with st.chat_message(role):
+                st.markdown(text)
+                if i is None:
+                    continue
+                
+                html = messages[i]["html"]
+                if i == latest_html_index:
+                    render_email_preview(html, key=str(i))
+                    _render_download_button(html, i)
+                else:
+                    # Older emails stay collapsed; the iframe is only mounted on request
+                    with st.expander("Previous email"):
+                        _render_download_button(html, i)
+                        if st.toggle("Show preview", key=f"show_preview_{i}"):
+                            render_email_preview(html, key=str(i))
+
+def _group_messages(messages: List[Dict]) -> List[Tuple[str, str, Optional[int]]]:
+    """
+    Group consecutive messages from the same role into runs, one chat bubble each.
+    
+    A message with an email ends its run, so the email stays under its text.
+    
+    Args:
+        messages: The chat history
+        
+    Returns:
+        (role, joined text, index of the message holding the run's email or
+        None) for each run
+    """
+    runs = []
+    texts: List[str] = []
+    for i, message in enumerate(messages):
+        texts.append(message["content"])
+        next_role = messages[i + 1]["role"] if i + 1 < len(messages) else None
+        if "html" in message or next_role != message["role"]:
+            runs.append((message["role"], "\n\n---\n\n".join(texts), i if "html" in message else None))
+            texts = []
+    return runs
+
+def _render_download_button(html: str, index: int) -> None:
+    """Render the download button for the email in message `index`; the key keeps buttons distinct"""
+    st.download_button(
+        "Download HTML",
+        html,
+        file_name="email_preview.html",
+        mime="text/html",
+        key=f"download_html_{index}"
+    )
+
+@st.fragment(run_every=0.5)
+def render_progress() -> None:
+    """
+    Render the progress of the background campaign.
+    
+    Runs as a fragment polling every half second, so only this block reruns
+    while the campaign worker fills its queue. Once the worker finishes, the
+    generated emails are added to the chat and the whole app reruns to show
+    them.
+    """
+    campaign = get_campaign_progress()
+    if not campaign:
+        return
+    
+    completed = campaign['completed']
+    total = campaign['total'] or 1
+    st.progress(min(len(completed) / total, 1.0), text=f"Generated {len(completed)} of {campaign['total']} emails")
+    for contact, result in completed:
+        name = contact.get('first_name', 'contact') if contact else "Campaign"
+        if isinstance(result, Exception):
+            st.error(f"{name}: {result}")
+        else:
+            st.caption(f"✅ {name}")
+    
+    if not campaign['running']:
+        assistant = registry.get_current_assistant()
+        for contact, result in completed:
+            if contact and not isinstance(result, Exception):
+                assistant.add_message(
+                    role="assistant",
+                    content=f"📧 Email for {contact.get('first_name', 'contact')} {contact.get('last_name', '')}".rstrip(),
+                    html=result
+                )
+        failures = [result for _, result in completed if isinstance(result, Exception)]
+        if failures:
+            assistant.add_message(
+                role="assistant",
+                content=f"⚠️ {len(failures)} email(s) could not be generated: {failures[0]}"
+            )
+        st.rerun()
@@ -5,10 +5,46 @@ This module provides common page setup and configuration functions.
 """
 import streamlit as st
 
+# Height of an email preview iframe, and of an expanded one, in pixels
+PREVIEW_HEIGHT = 400
+EXPANDED_PREVIEW_HEIGHT = 800
+
+# Page-wide styles, emitted in one block rather than from individual widgets
+_PAGE_CSS = """
+<style>
+div[data-testid="stSelectbox"] > div > div > div {
+    font-weight: bold;
+    font-size: 1.1em;
+}
+</style>
+"""
+
 def setup_page():
-    """Configure the Streamlit page settings"""
+    """
+    Configure the Streamlit page settings
+    
+    Must run on every script run: page config applies per run and per
+    session, so a process-wide "already configured" flag would leave every
+    session after the first without it.
+    """
     st.set_page_config(
         page_title="AI Assistants",
         page_icon="🧠",
         layout="wide"
     )
+    
+    # Streamlit drops elements a rerun does not emit, so this must run every
+    # rerun rather than once per session
+    st.markdown(_PAGE_CSS, unsafe_allow_html=True)
+
+def render_email_preview(html: str, key: str) -> None:
+    """
+    Render an email in a compact iframe that the user can expand
+    
+    Args:
+        html: The email HTML
+        key: Unique key for this preview's expand toggle
+    """
+    expanded = st.toggle("Expand preview", key=f"expand_preview_{key}")
+    height = EXPANDED_PREVIEW_HEIGHT if expanded else PREVIEW_HEIGHT
+    st.components.v1.html(html, height=height, scrolling=True)